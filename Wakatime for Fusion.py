@@ -1,43 +1,88 @@
 import os
 import time
-import http.client
+import threading
 import adsk.core, adsk.fusion, adsk.cam, traceback
-from configparser import ConfigParser
 from platform import uname
 import json
 
+from . import commands
+from . import config
+from .lib import fusionAddInUtils as futil
+from .lib import hackatimeUtils as hutil
+
 app = adsk.core.Application.get()
 ui = app.userInterface
 
+# Seconds stop_tracking waits for the sender thread beyond the shutdown deadline.
+SHUTDOWN_GRACE = 0.5
+
 class WakaTimeManager:
-    def __init__(self):
+    def __init__(self, directory=None):
+        """directory holds the offline queue, sent set and history, ~/.wakatime/fusion by default."""
         # Load API key from the config file
         self.api_key = self.load_api_key()
-        self.api_url = "waka.hackclub.com"  # API URL (without https://)
-        self.api_path = "/api/heartbeats"  # Path for heartbeats
+        self.api_url = hutil.DEFAULT_API_HOST  # API URL (without https://)
+        self.api_path = hutil.HEARTBEATS_PATH  # Path for heartbeats
+        self.connection = hutil.ApiConnection(self.api_url, timeout=config.REQUEST_TIMEOUT,
+                                              dns_ttl=config.DNS_CACHE_TTL)  # Kept-alive, pre-warmed connection
+        self.store = hutil.HeartbeatStore(directory)  # Offline queue and sent log on disk
+        self.sent_set = hutil.SentSet(self.store.directory)  # Ids of delivered heartbeats
+        self.history = hutil.ActivityHistory(self.store.history_directory)  # Columns for local reports
+        self.stats_server = None  # Localhost stats endpoint, only when config.STATS_SERVER is on
+        # exclude/include/hide_* rules from .wakatime.cfg
+        self.filter = hutil.HeartbeatFilter.from_config(hutil.load_wakatime_config())
         self.is_tracking = False
         self.document_opened_handler = None
         self.document_saved_handler = None
         self.document_activated_handler = None
         self.document_deactivated_handler = None
         self.command_created_handler = None  # Track command created event handler
+        self.workspace_activated_handler = None
+        # Active project, document, workspace and component, only re-read on activation events
+        self.context = hutil.EMPTY_CONTEXT
+        # Heartbeats are posted from a background thread, results come back through the bridge
+        self.bridge = futil.MainThreadBridge(config.heartbeat_event_id)
+        self._sender_thread = None
+        self._sender_wake = threading.Event()
+        self._sender_stopping = False
+        self._flush_deadline = None  # time.monotonic() by which a stopping sender must give up
+        self._in_flight = None  # Payloads the sender is posting right now
+        self._in_flight_lock = threading.Lock()  # Whoever takes _in_flight spills it, never both
+        # Heartbeats waiting for the sender, capped so an offline Fusion can't grow without bound.
+        # Saves go in the priority lane and are sent right away, everything else is batched.
+        # Saves are rare, so the priority lane gets a tenth of MAX_QUEUED_HEARTBEATS and
+        # the regular lane the rest, together they never hold more than the setting.
+        priority_max = max(1, config.MAX_QUEUED_HEARTBEATS // 10)
+        self.buffer = hutil.HeartbeatBuffer(
+            max_records=max(1, config.MAX_QUEUED_HEARTBEATS - priority_max),
+            overflow=config.QUEUE_OVERFLOW,
+            spill=self._spill_records)
+        self.priority_buffer = hutil.HeartbeatBuffer(
+            max_records=priority_max,
+            overflow=config.QUEUE_OVERFLOW,
+            spill=self._spill_records)
+        # Tunes batch size and flush interval from how the server responds
+        self.scheduler = hutil.AdaptiveFlushScheduler(
+            interval=config.FLUSH_INTERVAL,
+            max_interval=config.MAX_FLUSH_INTERVAL,
+            batch_size=config.HEARTBEAT_BATCH_SIZE,
+            max_batch_size=hutil.MAX_BATCH_SIZE,
+            target_rtt=config.TARGET_RTT)
+        self._test_heartbeat = None
+        # Fields that are the same for every heartbeat, merged in at flush time
+        self.common_fields = {
+            "language": "Fusion 360",
+            "Editor": "Fusion 360",
+            "operating_system": uname().system
+        }
+        # Keeps the handlers created through futil.add_handler alive while tracking
+        self._handlers = []
+        # Trace recorder, only used when config.RECORD_TRACE is enabled
+        self.recorder = None
 
     def load_api_key(self):
         """Load the API key from the .wakatime.cfg file."""
-        config_file = os.path.expanduser("~/.wakatime.cfg")  # Path to the .wakatime.cfg file
-
-        if not os.path.exists(config_file):
-            print(f"Config file not found: {config_file}")
-            return None
-       
-        config = ConfigParser()
-        config.read(config_file)
-
-        if 'settings' in config and 'api_key' in config['settings']:
-            return config['settings']['api_key']
-        else:
-            print("API key not found in the configuration file.")
-            return None
+        return hutil.load_api_key()
 
     def start_tracking(self):
         """Begin tracking Fusion 360 activity."""
@@ -55,22 +100,41 @@ class WakaTimeManager:
             return
 
         try:
-            # Create and add event handlers to the application object (not the document)
-            self.document_opened_handler = DocumentEventHandler(self.on_file_opened)
-            app.documentOpened.add(self.document_opened_handler)
+            if config.RECORD_TRACE:
+                self.start_recording()
+
+            self.bridge.start()
+            if config.PREWARM_CONNECTION:
+                self.connection.start()
+            self._start_sender()
+            if config.STATS_SERVER:
+                self.start_stats_server()
+
+            # Create and add event handlers to the application object (not the document).
+            # The names match the event attributes so recorded traces can be replayed.
+            self.document_opened_handler = futil.add_handler(
+                app.documentOpened, self.on_file_opened, name="documentOpened", local_handlers=self._handlers)
+
+            self.document_saved_handler = futil.add_handler(
+                app.documentSaved, self.on_file_saved, name="documentSaved", local_handlers=self._handlers)
+
+            self.document_activated_handler = futil.add_handler(
+                app.documentActivated, self.on_document_activated, name="documentActivated",
+                local_handlers=self._handlers)
 
-            self.document_saved_handler = DocumentEventHandler(self.on_file_saved)
-            app.documentSaved.add(self.document_saved_handler)
+            self.document_deactivated_handler = futil.add_handler(
+                app.documentDeactivated, self.on_document_deactivated, name="documentDeactivated",
+                local_handlers=self._handlers)
 
-            self.document_activated_handler = DocumentEventHandler(self.on_document_activated)
-            app.documentActivated.add(self.document_activated_handler)
+            # The commandCreated event lives on the `ui` object
+            self.command_created_handler = futil.add_handler(
+                ui.commandCreated, self.on_command_created, name="commandCreated", local_handlers=self._handlers)
 
-            self.document_deactivated_handler = DocumentEventHandler(self.on_document_deactivated)
-            app.documentDeactivated.add(self.document_deactivated_handler)
+            self.workspace_activated_handler = futil.add_handler(
+                ui.workspaceActivated, self.on_workspace_activated, name="workspaceActivated",
+                local_handlers=self._handlers)
 
-            # Correctly add the commandCreated event handler to `ui.commandCreated`
-            self.command_created_handler = CommandEventHandler(self.on_command_created)
-            ui.commandCreated.add(self.command_created_handler)  # Correct usage with the `ui` object
+            self.refresh_context(app.activeDocument)
 
             print("Tracking started.")
             ui.messageBox("WakaTime tracking started!")  # Notify the user
@@ -82,11 +146,17 @@ class WakaTimeManager:
             print(f"Error while starting tracking: {str(e)}")
             ui.messageBox(f"Error starting WakaTime tracking: {str(e)}")
 
-    def stop_tracking(self):
-        """Stop tracking Fusion 360 activity."""
+    def stop_tracking(self, notify=True, timeout=None):
+        """Stop tracking Fusion 360 activity.
+
+        Heartbeats still queued are sent for at most `timeout` seconds
+        (config.SHUTDOWN_TIMEOUT by default), whatever is left after that is
+        saved to the offline queue so a slow or dead server never holds Fusion up.
+        """
         self.is_tracking = False
         print("Tracking stopped.")
-        ui.messageBox("WakaTime tracking stopped.")  # Notify the user
+        if notify:
+            ui.messageBox("WakaTime tracking stopped.")  # Notify the user
 
         # Remove event handlers when stopping
         try:
@@ -111,56 +181,80 @@ class WakaTimeManager:
                 ui.commandCreated.remove(self.command_created_handler)
                 self.command_created_handler = None
 
+            if self.workspace_activated_handler:
+                ui.workspaceActivated.remove(self.workspace_activated_handler)
+                self.workspace_activated_handler = None
+
+            self._handlers = []
             print("Event handlers removed successfully.")
         except Exception as e:
             print(f"Error while removing event handlers: {str(e)}")
 
+        timeout = config.SHUTDOWN_TIMEOUT if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        self._stop_sender(timeout)
+        # The warmer only gets what is left of the shutdown budget.
+        self.connection.stop(deadline - time.monotonic())
+        self.bridge.stop()
+        self.stop_recording()
+        self.stop_stats_server()
+
+    def start_recording(self, path=None):
+        """Record every add-in event to a trace file that tools/replay.py can play back."""
+        if self.recorder:
+            return self.recorder.path
+        path = path or os.path.join(self.store.directory, "traces", time.strftime("trace-%Y%m%d-%H%M%S.jsonl"))
+        self.recorder = hutil.TraceRecorder(path)
+        futil.set_recorder(self.recorder)
+        print(f"Recording events to {path}")
+        return path
+
+    def stop_recording(self):
+        """Stop recording and write out what is still buffered."""
+        if not self.recorder:
+            return
+        futil.set_recorder(None)
+        self.recorder.close()
+        print(f"Event trace written to {self.recorder.path}")
+        self.recorder = None
+
+    def start_stats_server(self):
+        """Serve activity totals to local dashboards on 127.0.0.1."""
+        if self.stats_server:
+            return
+        server = hutil.StatsServer(self.store.history_directory, config.STATS_SERVER_PORT, config.STATS_CACHE_TTL)
+        try:
+            server.start()
+        except OSError as e:
+            # Another Fusion or add-in instance may have the port, tracking goes on without it.
+            print(f"Stats server could not start on port {config.STATS_SERVER_PORT}: {e}")
+            return
+        self.stats_server = server
+        print(f"Serving activity stats on {server.url}")
+
+    def stop_stats_server(self):
+        if not self.stats_server:
+            return
+        self.stats_server.stop()
+        self.stats_server = None
+
     def send_test_heartbeat(self):
         """Send a test heartbeat with project and file information."""
-        host = uname()
-        language = "Fusion 360"
-        editor = "Fusion 360"
         active_document = app.activeDocument
         
         #find current file and project
         if active_document is None:
             print("No active document found.")
             return
-        file_name = active_document.name
-        project_name = self.get_project_name(active_document)
-
-        payload = {
-            "time": time.time(),
-            "entity": file_name,
-            "project": project_name,
-            "type": "file",
-            "category": "test_start",
-            "language": language,
-            "Editor": editor,
-            "operating_system": uname().system
-        }
-
-        headers = {
-            "Authorization": f"Basic {self.api_key}"
-        }
-
-        print(f"Preparing to send test heartbeat: {payload}")
+        filtered = self.filter.apply(self.get_project_name(active_document), active_document.name)
+        if filtered is None:
+            print("Test heartbeat skipped, the active document is excluded.")
+            return
+        project_name, file_name = filtered
 
-        try:
-            conn = http.client.HTTPSConnection(self.api_url)
-            headers = {
-                "Authorization": f"Basic {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            conn.request("POST", self.api_path, body=json.dumps(payload), headers=headers)
-            response = conn.getresponse()
-            if response.status != 201:
-                print(f"Failed to send test heartbeat: {response.read().decode()}")
-            else:
-                print(f"Test heartbeat sent successfully: {response.status}")
-            conn.close()
-        except Exception as e:
-            print(f"Error sending test heartbeat: {str(e)}")
+        self._test_heartbeat = hutil.HeartbeatRecord(time.time(), file_name, project_name, "file", "test_start")
+        print(f"Preparing to send test heartbeat: {self._test_heartbeat}")
+        self._sender_wake.set()
 
     def on_file_opened(self, args):
         """Handle file opened event."""
@@ -170,7 +264,8 @@ class WakaTimeManager:
         project_name = self.get_project_name(args.document)
         entity_name = args.document.name  # Changed to entity_name for consistency
         print(f"Project Name: {project_name}, Entity Name: {entity_name}")  # Debugging
-        self.send_heartbeat(project_name, entity_name, "file_opened", extra_info={"action": "open"})
+        self.send_heartbeat(project_name, entity_name, "file_opened", extra_info={"action": "open"},
+                            context=self.context_for(args.document))
 
     def on_file_saved(self, args):
         """Handle file saved event."""
@@ -180,17 +275,27 @@ class WakaTimeManager:
         project_name = self.get_project_name(args.document)
         entity_name = args.document.name  # Changed to entity_name for consistency
         print(f"Project Name: {project_name}, Entity Name: {entity_name}")  # Debugging
-        self.send_heartbeat(project_name, entity_name, "file_saved", extra_info={"action": "save"})
+        self.send_heartbeat(project_name, entity_name, "file_saved", extra_info={"action": "save"}, priority=True,
+                            context=self.context_for(args.document))
 
     def on_document_activated(self, args):
         """Handle document activated event."""
         if not self.is_tracking or not self.api_key:
             return
         print(f"Document Activated: {args.document.name}")  # Debugging
-        project_name = self.get_project_name(args.document)
-        entity_name = args.document.name  # Changed to entity_name for consistency
-        print(f"Project Name: {project_name}, Entity Name: {entity_name}")  # Debugging
-        self.send_heartbeat(project_name, entity_name, "document_activated", extra_info={"action": "activate"})
+        context = self.refresh_context(args.document)
+        print(f"Context: {context}")  # Debugging
+        self.send_heartbeat(context.project, context.document, "document_activated",
+                            extra_info={"action": "activate"}, context=context)
+
+    def on_workspace_activated(self, args):
+        """Handle workspace activated event (Design, Manufacture, Drawing...)."""
+        if not self.is_tracking or not self.api_key:
+            return
+        # The active component belongs to the workspace's product, so it is re-read too.
+        self.context = self.context.replace(workspace=args.workspace.name,
+                                            component=self.get_active_component_name(app.activeDocument))
+        print(f"Workspace Activated: {self.context}")  # Debugging
 
     def on_document_deactivated(self, args):
         """Handle document deactivated event."""
@@ -200,7 +305,8 @@ class WakaTimeManager:
         project_name = self.get_project_name(args.document)
         entity_name = args.document.name  # Changed to entity_name for consistency
         print(f"Project Name: {project_name}, Entity Name: {entity_name}")  # Debugging
-        self.send_heartbeat(project_name, entity_name, "document_deactivated", extra_info={"action": "deactivate"})
+        self.send_heartbeat(project_name, entity_name, "document_deactivated", extra_info={"action": "deactivate"},
+                            context=self.context_for(args.document))
 
     def on_command_created(self, args):
         """Handle command created event."""
@@ -220,18 +326,56 @@ class WakaTimeManager:
                     print("Pan command detected. Skipping heartbeat.")
                     return
 
-                project_name = "Fusion 360"  # Get the project name
-                entity_name = command_definition.name  # Changed to entity_name for consistency
+                # Attribute the command to the cached context, no Fusion API calls per command.
+                context = self.context
+                if context.document:
+                    project_name, entity_name = context.project, context.document
+                else:
+                    project_name, entity_name = "Fusion 360", command_definition.name
 
                 # Add extra info such as the action type
-                extra_info = {"action": "create"}
-                self.send_heartbeat(project_name, entity_name, "command_created", extra_info=extra_info)
+                extra_info = {"action": "create", "command": command_definition.name}
+                self.send_heartbeat(project_name, entity_name, "command_created", extra_info=extra_info,
+                                    context=context)
             else:
                 print("No 'commandDefinition' attribute in ApplicationCommandEventArgs.")
                 print(f"Other available attributes in event args: {vars(args)}")
         except Exception as e:
             print(f"Error in on_command_created: {str(e)}")
 
+    def refresh_context(self, document=None):
+        """Re-read the active project, document, workspace and component from Fusion.
+
+        Only called when they can change (start, document activation). Heartbeats
+        reuse self.context instead of asking Fusion every time.
+        """
+        workspace = ui.activeWorkspace
+        if document is None:
+            self.context = hutil.ActivityContext(workspace=workspace.name if workspace else None)
+        else:
+            self.context = hutil.ActivityContext(
+                project=self.get_project_name(document),
+                document=document.name,
+                workspace=workspace.name if workspace else None,
+                component=self.get_active_component_name(document))
+        return self.context
+
+    def context_for(self, document):
+        """The cached context if it is for this document, otherwise None."""
+        return self.context if document.name == self.context.document else None
+
+    def get_active_component_name(self, document):
+        """Get the name of the active component of the document's design, if it has one."""
+        if document is None:
+            return None
+        try:
+            design = adsk.fusion.Design.cast(document.products.itemByProductType('DesignProductType'))
+            if design and design.activeComponent:
+                return design.activeComponent.name
+        except Exception as e:
+            print(f"Error getting active component: {e}")
+        return None
+
     def get_project_name(self, document):
         """Get the project name from the document."""
         try:
@@ -246,62 +390,246 @@ class WakaTimeManager:
         return project_name
 
 
-    def send_heartbeat(self, project_name, entity_name, action_type, extra_info=None):
-        """Send heartbeat event to WakaTime API."""
-        payload = {
-            "time": time.time(),
-            "entity": entity_name,
-            "project": project_name,
-            "type": action_type,
-            "category": action_type,
-            "language": "Fusion 360",
-            "Editor": "Fusion 360",
-            "operating_system": uname().system
-        }
-
-        if extra_info:
-            payload.update(extra_info)
+    def send_heartbeat(self, project_name, entity_name, action_type, extra_info=None, priority=False, context=None):
+        """Queue a heartbeat for the sender thread to deliver to the WakaTime API.
 
-        headers = {
-            "Authorization": f"Basic {self.api_key}",
-            "Content-Type": "application/json"
-        }
+        Priority heartbeats are sent right away, the rest are batched. The
+        context adds the workspace and active component to the heartbeat.
+        """
+        # Excluded heartbeats are dropped before anything is built or written.
+        filtered = self.filter.apply(project_name, entity_name)
+        if filtered is None:
+            return
+        if context is not None and context.component and filtered[1] != entity_name:
+            # Component names give away as much as the hidden document name.
+            context = context.replace(component=None)
+        project_name, entity_name = filtered
+
+        record = hutil.HeartbeatRecord(time.time(), entity_name, project_name, action_type, action_type, extra_info,
+                                       context)
+        if priority:
+            self.priority_buffer.append(record)
+            self._sender_wake.set()
+            return
 
-        try:
-            conn = http.client.HTTPSConnection(self.api_url)
-            conn.request("POST", self.api_path, body=json.dumps(payload), headers=headers)
-            response = conn.getresponse()
-            if response.status != 201:
-                print(f"Failed to send heartbeat: {response.read().decode()}")
-            else:
-                print(f"Heartbeat sent successfully: {response.status}")
-            conn.close()
-        except Exception as e:
-            print(f"Error sending heartbeat: {str(e)}")
+        self.buffer.append(record)
 
+        # Don't wait for the flush interval once a full batch is ready.
+        if len(self.buffer) >= self.scheduler.batch_size:
+            self._sender_wake.set()
 
-class DocumentEventHandler(adsk.core.DocumentEventHandler):
-    """Custom event handler for document events."""
+    def show_status(self, message):
+        """Show the latest heartbeat status in the palette. Runs on the main thread."""
+        palette = ui.palettes.itemById(config.sample_palette_id)
+        if palette:
+            palette.sendInfoToHTML("updateStatus", json.dumps({"status": message}))
 
-    def __init__(self, handler_function):
-        super().__init__()
-        self.handler_function = handler_function
+    def on_test_heartbeat_result(self, ok, message):
+        """Tell the user if the test heartbeat failed. Runs on the main thread."""
+        if not ok:
+            ui.messageBox(f"WakaTime test heartbeat failed: {message}")
 
-    def notify(self, args):
-        """Notify the event handler."""
-        self.handler_function(args)
+    def _start_sender(self):
+        """Start the background thread that posts queued heartbeats."""
+        if self._sender_thread and self._sender_thread.is_alive():
+            return
+        self._sender_stopping = False
+        self._sender_thread = threading.Thread(target=self._send_loop, name="HackatimeSender", daemon=True)
+        self._sender_thread.start()
+
+    def _stop_sender(self, timeout):
+        """Have the sender flush what is queued within timeout seconds, then wait for it.
+
+        Anything the sender could not deliver in time ends up in the offline queue.
+        """
+        if self._sender_thread is not None:
+            self._flush_deadline = time.monotonic() + timeout
+            self._sender_stopping = True
+            self._sender_wake.set()
+            # Requests are cut off at the deadline, the grace period covers the bookkeeping after them.
+            self._sender_thread.join(timeout + SHUTDOWN_GRACE)
+            if self._sender_thread.is_alive():
+                print("Sender thread did not finish in time, saving its heartbeats to the offline queue.")
+                in_flight = self._take_in_flight()
+                if in_flight:
+                    self.store.append_offline(in_flight)
+            self._sender_thread = None
+
+        self._spill_records(self.priority_buffer.drain())
+        self._spill_records(self.buffer.drain())
+        self.sent_set.save()
+        self._flush_deadline = None
+
+    def _send_loop(self):
+        """Post queued heartbeats. Runs on the sender thread and must not touch the Fusion API."""
+        while True:
+            self._sender_wake.wait(self.scheduler.time_until_flush())
+            self._sender_wake.clear()
+
+            stopping = self._sender_stopping
+            regular_due = stopping or self.scheduler.is_due() or len(self.buffer) >= self.scheduler.batch_size
+            if self._flush(regular_due) and regular_due and not stopping:
+                self._replay_offline()
+            if regular_due:
+                self.scheduler.flushed()
+            self.sent_set.save()
+            if stopping:
+                return
+
+    def _flush(self, regular_due):
+        """Send the priority lane, and the regular lane if it is due, in batches.
+        Runs on the sender thread.
+
+        Regular heartbeats fill up any room left in a priority batch even when
+        their lane is not due, the request is being made anyway.
+        Returns False if the server failed or the shutdown deadline passed.
+        """
+        test_heartbeat, self._test_heartbeat = self._test_heartbeat, None
+        if test_heartbeat:
+            # Test heartbeats are not real activity and are not kept.
+            ok, message, _ = self._timed_post(test_heartbeat.to_dict(self.common_fields))
+            print(message)
+            self.bridge.post("test_heartbeat", self.on_test_heartbeat_result, ok, message)
+
+        while True:
+            if self._flush_deadline is not None and time.monotonic() >= self._flush_deadline:
+                self._spill_records(self.priority_buffer.drain())
+                self._spill_records(self.buffer.drain())
+                return False
+
+            batch_size = self.scheduler.batch_size
+            records = self.priority_buffer.take(batch_size)
+            if len(records) < batch_size and (records or regular_due):
+                records += self.buffer.take(batch_size - len(records))
+            if not records:
+                return True
+
+            # Local history records activity whether or not the server takes it.
+            self.history.append(records)
+
+            # Heartbeats only become dicts and JSON here, right before they are sent.
+            payloads = [record.to_dict(self.common_fields) for record in records]
+            with self._in_flight_lock:
+                self._in_flight = payloads
+            ok, message, _ = self._timed_post(payloads)
+            # None if stop_tracking gave up waiting and already saved them to the offline queue.
+            still_ours = self._take_in_flight() is not None
+            print(message)
+            self.bridge.post("status", self.show_status, message)
+
+            if ok:
+                self.store.append_sent(payloads)
+                self.sent_set.add(record.id for record in records)
+            else:
+                # Keep the rest for later rather than hammering a server that is failing.
+                if still_ours:
+                    self.store.append_offline(payloads)
+                self._spill_records(self.priority_buffer.drain())
+                self._spill_records(self.buffer.drain())
+                return False
+
+    def _replay_offline(self):
+        """Resend the offline queue now that the server answers. Runs on the sender thread.
+
+        Heartbeats the sent set already knows about are skipped. They were
+        delivered by an earlier replay of the same claimed queue that was cut off,
+        for example by Fusion crashing or closing. The sent set is saved after
+        every batch so those ids survive such a crash. A request that timed out
+        on our side was never confirmed, so if it did reach the server it is
+        sent again.
+
+        Replies don't tune the scheduler, the live lane's cadence shouldn't
+        suffer for old heartbeats.
+        """
+        path = self.store.claim_offline()
+        if path is None:
+            return
 
+        pending = (payload for payload in hutil.iter_jsonl(path) if hutil.payload_id(payload) not in self.sent_set)
+        batches = hutil.chunked(pending, self.scheduler.batch_size)
+        for batch in batches:
+            # Not handed to stop_tracking as in flight: until the claim is released
+            # the batch is still in the claimed file, which a later start replays.
+            undelivered = batch if self._sender_stopping else self._replay_batch(batch)
+            if undelivered:
+                # Put what is left of this batch and everything after it back in the offline queue.
+                self.store.append_offline(undelivered)
+                self.store.append_offline(payload for rest in batches for payload in rest)
+                break
+
+        self.store.release_claim(path)
+
+    def _replay_batch(self, batch):
+        """Send one batch from the offline queue. Returns the payloads still to be delivered.
+
+        A batch the server rejects outright is split in halves until the
+        heartbeats it refuses are found, those go to the rejected file instead
+        of blocking the queue forever.
+        """
+        ok, message, status = self._timed_post(batch, tune=False)
+        print(f"Offline queue: {message}")
+        if ok:
+            self.store.append_sent(batch)
+            self.sent_set.add(hutil.payload_id(payload) for payload in batch)
+            self.sent_set.save()
+            return []
+        if not hutil.is_rejected(status):
+            return batch
+        if len(batch) == 1:
+            print(f"Offline queue: the server rejected a heartbeat, moved it to {self.store.rejected_path}")
+            self.store.append_rejected(batch)
+            return []
+
+        middle = len(batch) // 2
+        undelivered = self._replay_batch(batch[:middle])
+        if undelivered:
+            return undelivered + batch[middle:]
+        return self._replay_batch(batch[middle:])
+
+    def _take_in_flight(self):
+        """Take the payloads being posted, leaving None so nobody else spills them too."""
+        with self._in_flight_lock:
+            in_flight, self._in_flight = self._in_flight, None
+            return in_flight
+
+    def _timed_post(self, payload, tune=True):
+        """_post_heartbeat, feeding the round trip time and outcome to the scheduler if tune is set."""
+        started = time.monotonic()
+        ok, message, status = self._post_heartbeat(payload)
+        if tune:
+            self.scheduler.record(ok, time.monotonic() - started)
+        return ok, message, status
+
+    def _spill_records(self, records):
+        """Move records out of memory into the offline queue."""
+        if records:
+            self.history.append(records)
+            self.store.append_offline(record.to_dict(self.common_fields) for record in records)
+
+    def _post_heartbeat(self, payload):
+        """Send a heartbeat, or a list of them, to the WakaTime API.
+
+        Returns (ok, status message, HTTP status or None if there was no response).
+        """
+        headers = hutil.build_headers(self.api_key)
+
+        # While stopping, no request may outlive the shutdown deadline.
+        timeout = config.REQUEST_TIMEOUT
+        if self._flush_deadline is not None:
+            timeout = max(0.1, min(timeout, self._flush_deadline - time.monotonic()))
 
-class CommandEventHandler(adsk.core.ApplicationCommandEventHandler):
-    """Custom event handler for command created events."""
+        try:
+            status, text = self.connection.request("POST", self.api_path, body=json.dumps(payload),
+                                                   headers=headers, timeout=timeout)
+        except Exception as e:
+            return False, f"Error sending heartbeat: {str(e)}", None
 
-    def __init__(self, handler_function):
-        super().__init__()
-        self.handler_function = handler_function
+        if status not in hutil.ACCEPTED_STATUSES:
+            return False, f"Failed to send heartbeat: {text}", status
+        if isinstance(payload, list):
+            return True, f"{len(payload)} heartbeats sent successfully: {status}", status
+        return True, f"Heartbeat sent successfully: {status}", status
 
-    def notify(self, args):
-        """Notify the event handler."""
-        self.handler_function(args)
 
 waka_manager = None
 
@@ -316,3 +644,25 @@ def run(context):
         print(f"Error: {str(e)}")
         if waka_manager:
             waka_manager.stop_tracking()
+
+    # Create the add-in's commands and palette. A button that can't be created
+    # (for example one left behind by an unclean unload) must not stop tracking.
+    try:
+        commands.start()
+    except Exception as e:
+        print(f"Error creating commands: {str(e)}")
+
+
+def stop(context):
+    global waka_manager
+    try:
+        # Stop intake, flush within config.SHUTDOWN_TIMEOUT and spill the rest to disk.
+        if waka_manager:
+            waka_manager.stop_tracking(notify=False)
+            waka_manager = None
+
+        # Remove the add-in's commands and palette, commands.stop() also releases their handlers
+        commands.stop()
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
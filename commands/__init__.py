@@ -1,30 +1,35 @@
 # Here you define the commands that will be added to your add-in.
 
-# TODO Import the modules corresponding to the commands you created.
+# TODO Import the packages corresponding to the commands you created.
 # If you want to add an additional command, duplicate one of the existing directories and import it here.
-# You need to use aliases (import "entry" as "my_module") assuming you have the default module named "entry".
-from .commandDialog import entry as commandDialog
-from .paletteShow import entry as paletteShow
-from .paletteSend import entry as paletteSend
+# Importing a command package only reads its declaration in __init__.py, the
+# command's entry module is imported the first time its button is clicked.
+from ..lib import fusionAddInUtils as futil
+from .registry import LazyCommand
+from . import profileAddin, paletteShow, paletteSend
 
-# TODO add your imported modules to this list.
-# Fusion will automatically call the start() and stop() functions.
+# TODO add your command packages to this list.
+# Commands not listed in config.ENABLED_COMMANDS are skipped.
 commands = [
-    commandDialog,
-    paletteShow,
-    paletteSend
+    LazyCommand(profileAddin),
+    LazyCommand(paletteShow),
+    LazyCommand(paletteSend),
 ]
 
 
-# Assumes you defined a "start" function in each of your modules.
+# Creates the buttons of the enabled commands.
 # The start function will be run when the add-in is started.
 def start():
     for command in commands:
         command.start()
 
 
-# Assumes you defined a "stop" function in each of your modules.
+# Removes the buttons and lets the commands that were used clean up.
 # The stop function will be run when the add-in is stopped.
 def stop():
     for command in commands:
-        command.stop()
\ No newline at end of file
+        command.stop()
+
+    # The command definitions and palettes are gone, release the handlers the
+    # commands attached to them so a later start() doesn't add to the list.
+    futil.clear_handlers()
@@ -2,18 +2,16 @@ import json
 import adsk.core
 import os
 from ...lib import fusionAddInUtils as futil
+from ...lib import hackatimeUtils as hutil
 from ... import config
+from . import CMD_NAME
 from datetime import datetime
 
 app = adsk.core.Application.get()
 ui = app.userInterface
 
 # TODO ********************* Change these names *********************
-CMD_ID = f'{config.COMPANY_NAME}_{config.ADDIN_NAME}_PalleteShow'
-CMD_NAME = 'Show My Palette'
-CMD_Description = 'A Fusion Add-in Palette'
 PALETTE_NAME = 'My Palette Sample'
-IS_PROMOTED = False
 
 # Using "global" variables by referencing values from /config.py
 PALETTE_ID = config.sample_palette_id
@@ -28,61 +26,25 @@ PALETTE_URL = PALETTE_URL.replace('\\', '/')
 # Set a default docking behavior for the palette
 PALETTE_DOCKING = adsk.core.PaletteDockingStates.PaletteDockStateRight
 
-# TODO *** Define the location where the command button will be created. ***
-# This is done by specifying the workspace, the tab, and the panel, and the 
-# command it will be inserted beside. Not providing the command to position it
-# will insert it at the end.
-WORKSPACE_ID = 'FusionSolidEnvironment'
-PANEL_ID = 'SolidScriptsAddinsPanel'
-COMMAND_BESIDE_ID = 'ScriptsManagerCommand'
-
-# Resource location for command icons, here we assume a sub folder in this directory named "resources".
-ICON_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources', '')
-
 # Local list of event handlers used to maintain a reference so
 # they are not released and garbage collected.
 local_handlers = []
 
+# Activity totals for the palette, computed off the main thread.
+activity_cache = None
 
-# Executed when add-in is run.
-def start():
-    # Create a command Definition.
-    cmd_def = ui.commandDefinitions.addButtonDefinition(CMD_ID, CMD_NAME, CMD_Description, ICON_FOLDER)
-
-    # Add command created handler. The function passed here will be executed when the command is executed.
-    futil.add_handler(cmd_def.commandCreated, command_created)
-
-    # ******** Add a button into the UI so the user can run the command. ********
-    # Get the target workspace the button will be created in.
-    workspace = ui.workspaces.itemById(WORKSPACE_ID)
-
-    # Get the panel the button will be created in.
-    panel = workspace.toolbarPanels.itemById(PANEL_ID)
 
-    # Create the button command control in the UI after the specified existing command.
-    control = panel.controls.addCommand(cmd_def, COMMAND_BESIDE_ID, False)
+def get_activity_cache():
+    global activity_cache
+    if activity_cache is None:
+        activity_cache = hutil.SummaryCache(hutil.HeartbeatStore().history_directory)
+    return activity_cache
 
-    # Specify if the command is promoted to the main toolbar. 
-    control.isPromoted = IS_PROMOTED
 
-
-# Executed when add-in is stopped.
+# Executed when add-in is stopped, if the command was used.
 def stop():
-    # Get the various UI elements for this command
-    workspace = ui.workspaces.itemById(WORKSPACE_ID)
-    panel = workspace.toolbarPanels.itemById(PANEL_ID)
-    command_control = panel.controls.itemById(CMD_ID)
-    command_definition = ui.commandDefinitions.itemById(CMD_ID)
     palette = ui.palettes.itemById(PALETTE_ID)
 
-    # Delete the button command control
-    if command_control:
-        command_control.deleteMe()
-
-    # Delete the command definition
-    if command_definition:
-        command_definition.deleteMe()
-
     # Delete the Palette
     if palette:
         palette.deleteMe()
@@ -131,6 +93,9 @@ def command_execute(args: adsk.core.CommandEventArgs):
 
     palette.isVisible = True
 
+    # Start totalling the history now so the first Refresh has something to show.
+    get_activity_cache().get()
+
 
 # Use this to handle a user closing your palette.
 def palette_closed(args: adsk.core.UserInterfaceGeneralEventArgs):
@@ -169,6 +134,14 @@ def palette_incoming(html_args: adsk.core.HTMLEventArgs):
 
     # TODO ******** Your palette reaction code here ********
 
+    # The palette asks for the local activity summary. Totalling the history can take
+    # a while without NumPy, so the last totals are returned right away and updated
+    # in the background, the palette asks again while they are not up to date.
+    if message_action == 'getActivity':
+        summary, fresh = get_activity_cache().get()
+        html_args.returnData = json.dumps({"summary": summary, "fresh": fresh})
+        return
+
     # Read message sent from palette javascript and react appropriately.
     if message_action == 'messageFromPalette':
         arg1 = message_data.get('arg1', 'arg1 not sent')
@@ -29,11 +29,66 @@ function updateMessage(messageString) {
         `<b>Your value</b>: ${messageData.myValue}`;
 }
 
+function formatDuration(seconds) {
+    const minutes = Math.floor(seconds / 60);
+    return `${Math.floor(minutes / 60)}h ${String(minutes % 60).padStart(2, "0")}m`;
+}
+
+function renderTotals(title, totals, total) {
+    // Project names come from the user's documents, so they are added as text, never as HTML.
+    const section = document.createElement("div");
+    const heading = document.createElement("b");
+    heading.textContent = `${title}: ${formatDuration(total)}`;
+    section.appendChild(heading);
+    Object.entries(totals)
+        .sort((a, b) => b[1] - a[1])
+        .forEach(([project, seconds]) => {
+            const row = document.createElement("div");
+            row.textContent = `${formatDuration(seconds)} - ${project}`;
+            section.appendChild(row);
+        });
+    return section;
+}
+
+// Milliseconds between asks while Fusion is still totalling the history.
+const ACTIVITY_RETRY_DELAY = 500;
+const ACTIVITY_RETRIES = 20;
+
+function requestActivity(retries = ACTIVITY_RETRIES) {
+    // Ask Fusion for today's and this week's totals from the local history.
+    adsk.fusionSendData("getActivity", "{}").then((result) => {
+        const reply = JSON.parse(result);
+        const activity = document.getElementById("activity");
+        if (reply.summary) {
+            const summary = reply.summary;
+            activity.replaceChildren(
+                renderTotals("Today", summary.today, summary.today_total),
+                document.createElement("br"),
+                renderTotals("This week", summary.week, summary.week_total));
+        } else {
+            activity.textContent = "Calculating...";
+        }
+        // Fusion totals in the background, ask again until the totals are up to date.
+        if (!reply.fresh && retries > 0) {
+            setTimeout(() => requestActivity(retries - 1), ACTIVITY_RETRY_DELAY);
+        }
+    });
+}
+
+function updateStatus(messageString) {
+    // Latest heartbeat status sent by the add-in as a JSON string.
+    const messageData = JSON.parse(messageString);
+    // The status can contain the server's response body, never parse it as HTML.
+    document.getElementById("hackatimeStatus").textContent = `${messageData.status}`;
+}
+
 window.fusionJavaScriptHandler = {
     handle: function (action, data) {
         try {
             if (action === "updateMessage") {
                 updateMessage(data);
+            } else if (action === "updateStatus") {
+                updateStatus(data);
             } else if (action === "debugger") {
                 debugger;
             } else {
@@ -0,0 +1,20 @@
+# Declaration of the command, read at add-in start. The command itself is in
+# entry.py and is only imported when the button is first clicked.
+import os
+from ... import config
+
+CMD_ID = f'{config.COMPANY_NAME}_{config.ADDIN_NAME}_profileAddin'
+CMD_NAME = 'Profile Hackatime add-in'
+CMD_Description = 'Profile the Hackatime add-in for a while and write a cProfile and memory report to disk'
+
+# Specify that the command will be promoted to the panel.
+IS_PROMOTED = False
+
+# Where the button is created: the workspace, the panel, and the command it is
+# inserted beside. Not providing the command to position it will insert it at the end.
+WORKSPACE_ID = 'FusionSolidEnvironment'
+PANEL_ID = 'SolidScriptsAddinsPanel'
+COMMAND_BESIDE_ID = 'ScriptsManagerCommand'
+
+# Resource location for command icons, here we assume a sub folder in this directory named "resources".
+ICON_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources', '')
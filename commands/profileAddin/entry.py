@@ -0,0 +1,119 @@
+import adsk.core
+import os
+import threading
+from ...lib import fusionAddInUtils as futil
+from ...lib import hackatimeUtils as hutil
+from ... import config
+from . import CMD_NAME
+app = adsk.core.Application.get()
+ui = app.userInterface
+
+# Profiling window offered in the dialog, in seconds.
+DEFAULT_DURATION = 60
+MIN_DURATION = 5
+MAX_DURATION = 1800
+
+# Where the .prof files and reports are written.
+OUTPUT_FOLDER = os.path.join(hutil.DEFAULT_DIRECTORY, 'profiles')
+
+# Local list of event handlers used to maintain a reference so
+# they are not released and garbage collected.
+local_handlers = []
+
+# The timer that ends profiling runs on its own thread, the bridge brings the
+# end of the run back to the main thread where the handlers are profiled.
+bridge = futil.MainThreadBridge(config.profile_event_id)
+profiler = None
+timer = None
+
+
+# Executed when add-in is stopped, if the command was used.
+def stop():
+    # Write out a profile that is still running rather than losing it.
+    if profiler:
+        finish_profiling()
+    bridge.stop()
+
+
+# Function that is called when a user clicks the corresponding button in the UI.
+# This defines the contents of the command dialog and connects to the command related events.
+def command_created(args: adsk.core.CommandCreatedEventArgs):
+    # General logging for debug.
+    futil.log(f'{CMD_NAME} Command Created Event')
+
+    # https://help.autodesk.com/view/fusion360/ENU/?contextId=CommandInputs
+    inputs = args.command.commandInputs
+
+    # How long to profile for.
+    inputs.addIntegerSpinnerCommandInput('duration', 'Duration (seconds)', MIN_DURATION, MAX_DURATION, 5,
+                                         DEFAULT_DURATION)
+
+    futil.add_handler(args.command.execute, command_execute, local_handlers=local_handlers)
+    futil.add_handler(args.command.validateInputs, command_validate_input, local_handlers=local_handlers)
+    futil.add_handler(args.command.destroy, command_destroy, local_handlers=local_handlers)
+
+
+# This event handler is called when the user clicks the OK button in the command dialog.
+def command_execute(args: adsk.core.CommandEventArgs):
+    global profiler, timer
+
+    # General logging for debug.
+    futil.log(f'{CMD_NAME} Command Execute Event')
+
+    if profiler:
+        ui.messageBox('The Hackatime add-in is already being profiled.')
+        return
+
+    inputs = args.command.commandInputs
+    duration_input: adsk.core.IntegerSpinnerCommandInput = inputs.itemById('duration')
+    duration = duration_input.value
+
+    # The bridge is only needed once a profile runs.
+    bridge.start()
+
+    profiler = hutil.HandlerProfiler(OUTPUT_FOLDER)
+    profiler.start()
+    futil.set_profiler(profiler)
+
+    timer = threading.Timer(duration, bridge.post, args=('finish', finish_profiling))
+    timer.daemon = True
+    timer.start()
+
+    futil.log(f'{CMD_NAME}: profiling for {duration} seconds', force_console=True)
+
+
+# Ends the profiling run and writes the results. Runs on the main thread.
+def finish_profiling():
+    global profiler, timer
+
+    if timer:
+        timer.cancel()
+        timer = None
+    if not profiler:
+        return
+
+    futil.set_profiler(None)
+    finished, profiler = profiler, None
+    profile_path, report_path = finished.finish()
+
+    futil.log(f'{CMD_NAME}: wrote {profile_path} and {report_path}', force_console=True)
+    ui.messageBox(f'Hackatime add-in profile written to:<br>{profile_path}<br>{report_path}')
+
+
+# This event handler is called when the user interacts with any of the inputs in the dialog
+# which allows you to verify that all of the inputs are valid and enables the OK button.
+def command_validate_input(args: adsk.core.ValidateInputsEventArgs):
+    inputs = args.inputs
+
+    # Verify the validity of the input values. This controls if the OK button is enabled or not.
+    duration_input = inputs.itemById('duration')
+    args.areInputsValid = MIN_DURATION <= duration_input.value <= MAX_DURATION
+
+
+# This event handler is called when the command terminates.
+def command_destroy(args: adsk.core.CommandEventArgs):
+    # General logging for debug.
+    futil.log(f'{CMD_NAME} Command Destroy Event')
+
+    global local_handlers
+    local_handlers = []
@@ -0,0 +1,82 @@
+# Lazy command registration.
+#
+# Every command is declared up front by its package's __init__.py, which only
+# holds the constants needed to put a button in the UI (id, name, tooltip,
+# panel and icon folder). At add-in start the registry creates the button
+# definitions and controls from those constants alone. The command's entry
+# module, with its imports, dialogs, handlers and palettes, is only imported
+# the first time the button is clicked. Commands not listed in
+# config.ENABLED_COMMANDS get no button at all.
+#
+# An entry module provides:
+#   command_created(args) -- called for every click, like a commandCreated handler
+#   stop()                -- optional, called at add-in stop if the module was loaded
+
+import importlib
+
+import adsk.core
+from ..lib import fusionAddInUtils as futil
+from .. import config
+
+app = adsk.core.Application.get()
+ui = app.userInterface
+
+
+class LazyCommand:
+    """A button whose command module is imported on first click."""
+
+    def __init__(self, package):
+        self.package = package
+        self.name = package.__name__.rsplit('.', 1)[-1]
+        self.id = package.CMD_ID
+        self.module = None
+        self._handlers = []
+
+    @property
+    def is_enabled(self):
+        return self.name in config.ENABLED_COMMANDS
+
+    @property
+    def is_loaded(self):
+        return self.module is not None
+
+    def start(self):
+        if not self.is_enabled:
+            return
+
+        package = self.package
+        # Fusion reads the icons from the folder itself when it first draws the button.
+        cmd_def = ui.commandDefinitions.addButtonDefinition(
+            package.CMD_ID, package.CMD_NAME, package.CMD_Description, package.ICON_FOLDER)
+        futil.add_handler(cmd_def.commandCreated, self._command_created, name=self.name,
+                          local_handlers=self._handlers)
+
+        workspace = ui.workspaces.itemById(package.WORKSPACE_ID)
+        panel = workspace.toolbarPanels.itemById(package.PANEL_ID)
+        control = panel.controls.addCommand(cmd_def, package.COMMAND_BESIDE_ID, False)
+        control.isPromoted = package.IS_PROMOTED
+
+    def stop(self):
+        if self.module is not None and hasattr(self.module, 'stop'):
+            self.module.stop()
+
+        workspace = ui.workspaces.itemById(self.package.WORKSPACE_ID)
+        panel = workspace.toolbarPanels.itemById(self.package.PANEL_ID)
+        command_control = panel.controls.itemById(self.id)
+        command_definition = ui.commandDefinitions.itemById(self.id)
+
+        if command_control:
+            command_control.deleteMe()
+        if command_definition:
+            command_definition.deleteMe()
+        self._handlers = []
+
+    def load(self):
+        """Import the command's entry module if that hasn't happened yet."""
+        if self.module is None:
+            self.module = importlib.import_module('.entry', self.package.__name__)
+            futil.log(f'{self.package.CMD_NAME}: command loaded')
+        return self.module
+
+    def _command_created(self, args: adsk.core.CommandCreatedEventArgs):
+        self.load().command_created(args)
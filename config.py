@@ -10,6 +10,51 @@ import os
 # are ready to distribute it.
 DEBUG = True
 
+# Flag that records every event the add-in handles to a trace file in
+# ~/.wakatime/fusion/traces. Traces can be played back outside of Fusion with
+# tools/replay.py to reproduce performance problems. Leave this off normally.
+RECORD_TRACE = False
+
+# Heartbeats are queued in memory and sent in batches by a background thread.
+# Saves are sent right away. Other heartbeats are sent as soon as a full batch
+# is waiting, and after FLUSH_INTERVAL seconds at the latest. Batches start at
+# HEARTBEAT_BATCH_SIZE heartbeats and grow while the server accepts them, up to
+# the 25 a bulk request may hold. Requests slower than TARGET_RTT seconds and
+# errors stretch the interval up to MAX_FLUSH_INTERVAL, errors also halve the batch.
+FLUSH_INTERVAL = 30
+MAX_FLUSH_INTERVAL = 300
+HEARTBEAT_BATCH_SIZE = 10
+TARGET_RTT = 1.0
+
+# Most heartbeats kept in memory while the server can't be reached, saves and
+# everything else together, and what happens to the oldest ones past that:
+# 'spill' moves them to the offline queue on disk, 'drop_oldest' and
+# 'drop_newest' discard heartbeats.
+MAX_QUEUED_HEARTBEATS = 10000
+QUEUE_OVERFLOW = 'spill'
+
+# Seconds a single request to the server may take before it is abandoned.
+REQUEST_TIMEOUT = 10
+
+# Heartbeats go out over one kept-alive connection. With PREWARM_CONNECTION the
+# add-in connects in the background at startup and after the computer wakes up,
+# so the first heartbeat doesn't wait for DNS, TCP and TLS. DNS answers for the
+# server are reused for DNS_CACHE_TTL seconds.
+PREWARM_CONNECTION = True
+DNS_CACHE_TTL = 300
+
+# Seconds the add-in may spend sending queued heartbeats when it is stopped or
+# Fusion closes. Whatever isn't sent by then is saved to the offline queue.
+SHUTDOWN_TIMEOUT = 3
+
+# Opt-in read-only stats endpoint for local dashboards. When enabled the add-in
+# serves today's and this week's totals per project and document as JSON on
+# http://127.0.0.1:STATS_SERVER_PORT/stats. Totals are recomputed from the local
+# history at most every STATS_CACHE_TTL seconds.
+STATS_SERVER = False
+STATS_SERVER_PORT = 8787
+STATS_CACHE_TTL = 30
+
 # Gets the name of the add-in from the name of the folder the py file is in.
 # This is used when defining unique internal names for various UI elements 
 # that need a unique name. It's also recommended to use a company name as 
@@ -17,5 +62,15 @@ DEBUG = True
 ADDIN_NAME = os.path.basename(os.path.dirname(__file__))
 COMPANY_NAME = 'ACME'
 
+# Commands that get a button in the Scripts and Add-ins panel, by folder name
+# in commands/. A command's code is only loaded when its button is first clicked.
+# 'paletteSend' is the template's demo command for sending text to the palette.
+ENABLED_COMMANDS = ['profileAddin', 'paletteShow']
+
 # Palettes
-sample_palette_id = f'{COMPANY_NAME}_{ADDIN_NAME}_palette_id'
\ No newline at end of file
+sample_palette_id = f'{COMPANY_NAME}_{ADDIN_NAME}_palette_id'
+
+# Custom events
+# Fired by background threads to get results back onto Fusion's main thread.
+heartbeat_event_id = f'{COMPANY_NAME}_{ADDIN_NAME}_heartbeat_event'
+profile_event_id = f'{COMPANY_NAME}_{ADDIN_NAME}_profile_event'
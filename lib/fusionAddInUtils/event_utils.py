@@ -10,6 +10,7 @@
 #  UNINTERRUPTED OR ERROR FREE.
 
 import sys
+import time
 from typing import Callable
 
 import adsk.core
@@ -19,6 +20,12 @@ from .general_utils import handle_error
 # Global Variable to hold Event Handlers
 _handlers = []
 
+# Optional recorder that is told about every event handled through add_handler.
+_recorder = None
+
+# Optional profiler that is switched on while a handler runs.
+_profiler = None
+
 
 def add_handler(
         event: adsk.core.Event,
@@ -60,6 +67,29 @@ def clear_handlers():
     _handlers = []
 
 
+def set_recorder(recorder):
+    """Sets the object that records every handled event, or None to stop recording.
+
+    Arguments:
+    recorder -- An object with a record(name, args, start, duration) method. It is
+                called on the main thread after each handler runs, so it must be
+                cheap. See hackatimeUtils.TraceRecorder.
+    """
+    global _recorder
+    _recorder = recorder
+
+
+def set_profiler(profiler):
+    """Sets the object that profiles every handler call, or None to stop profiling.
+
+    Arguments:
+    profiler -- An object with enter() and exit() methods called on the main thread
+                around each handler. See hackatimeUtils.HandlerProfiler.
+    """
+    global _profiler
+    _profiler = profiler
+
+
 def _create_handler(
         handler_type,
         callback: Callable,
@@ -80,9 +110,23 @@ def _define_handler(handler_type, callback, name: str = None):
             super().__init__()
 
         def notify(self, args):
+            recorder = _recorder
+            profiler = _profiler
+            start = time.perf_counter() if recorder is not None else 0.0
             try:
+                if profiler is not None:
+                    profiler.enter()
                 callback(args)
             except:
                 handle_error(name)
+            finally:
+                # A failing profiler or trace file must not reach Fusion's event dispatch either.
+                try:
+                    if profiler is not None:
+                        profiler.exit()
+                    if recorder is not None:
+                        recorder.record(name, args, start, time.perf_counter() - start)
+                except:
+                    handle_error(name)
 
     return Handler
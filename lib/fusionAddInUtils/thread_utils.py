@@ -0,0 +1,90 @@
+import threading
+from typing import Callable
+
+import adsk.core
+from .event_utils import add_handler
+from .general_utils import handle_error
+
+app = adsk.core.Application.get()
+
+
+class MainThreadBridge:
+    """Marshals work from background threads back onto Fusion's main thread.
+
+    The Fusion API must only be used from the main thread. Worker threads call
+    post() to drop a callback into a mailbox, and the first post after a
+    dispatch fires a custom event. Fusion then calls dispatch on the main thread,
+    which runs everything in the mailbox at once. Posts that share a key replace
+    each other while they wait, so a burst of status updates from a worker
+    results in a single main thread dispatch showing only the latest one.
+    """
+
+    def __init__(self, event_id: str):
+        self.event_id = event_id
+        self._lock = threading.Lock()
+        self._mailbox = {}
+        self._fired = False
+        self._custom_event = None
+        self._handlers = []
+
+    @property
+    def is_running(self):
+        return self._custom_event is not None
+
+    def start(self):
+        """Registers the custom event. Must be called from the main thread."""
+        if self._custom_event is not None:
+            return
+        self._custom_event = app.registerCustomEvent(self.event_id)
+        add_handler(self._custom_event, self._dispatch, name=self.event_id, local_handlers=self._handlers)
+
+    def stop(self):
+        """Unregisters the custom event and drops anything not yet dispatched.
+        Must be called from the main thread.
+        """
+        with self._lock:
+            custom_event, self._custom_event = self._custom_event, None
+            self._mailbox = {}
+            self._fired = False
+
+        if custom_event is not None:
+            for handler in self._handlers:
+                custom_event.remove(handler)
+            app.unregisterCustomEvent(self.event_id)
+        self._handlers = []
+
+    def post(self, key, callback: Callable, *args):
+        """Queues callback(*args) to run on the main thread. Safe to call from any thread.
+
+        Arguments:
+        key -- Posts with the same key coalesce, only the latest one runs. Use None
+               for a post that must not be replaced by later ones.
+        callback -- The function to run on the main thread.
+
+        :returns:
+            False if the bridge is not running and the post was dropped.
+        """
+        if key is None:
+            key = object()
+
+        with self._lock:
+            if self._custom_event is None:
+                return False
+            self._mailbox[key] = (callback, args)
+            if self._fired:
+                return True
+            self._fired = True
+
+        app.fireCustomEvent(self.event_id)
+        return True
+
+    def _dispatch(self, args: adsk.core.CustomEventArgs):
+        with self._lock:
+            mailbox, self._mailbox = self._mailbox, {}
+            self._fired = False
+
+        for callback, callback_args in mailbox.values():
+            try:
+                callback(*callback_args)
+            except:
+                handle_error(f'{self.event_id} dispatch')
@@ -0,0 +1,12 @@
+from .api import *
+from .store import *
+from .trace import *
+from .records import *
+from .filters import *
+from .sent_set import *
+from .scheduler import *
+from .profiling import *
+from .history import *
+from .stats_server import *
+from .connection import *
+from .context import *
@@ -0,0 +1,64 @@
+# Helpers shared by the add-in and the command line tools for talking to a
+# WakaTime compatible server (Hackatime, Wakapi, WakaTime).
+#
+# Nothing in here imports adsk so these helpers can be used outside of Fusion.
+
+import os
+from configparser import ConfigParser
+
+# Default server the add-in reports to (without https://).
+DEFAULT_API_HOST = "waka.hackclub.com"
+
+# Path for heartbeats. The endpoint accepts a single heartbeat or a list.
+HEARTBEATS_PATH = "/api/heartbeats"
+
+# Most WakaTime compatible servers reject bulk requests with more than 25 heartbeats.
+MAX_BATCH_SIZE = 25
+
+# Status codes a WakaTime compatible server answers with when heartbeats are accepted.
+ACCEPTED_STATUSES = (200, 201, 202)
+
+# Client errors that say nothing about the heartbeats themselves: timeouts, rate
+# limits, and a wrong API key or server address, which affect every heartbeat
+# until the user fixes them. These are retried later like server errors.
+RETRYABLE_CLIENT_STATUSES = (401, 403, 404, 408, 429)
+
+
+def is_rejected(status):
+    """Whether the server refused the heartbeats themselves, so retrying them can never work."""
+    return status is not None and 400 <= status < 500 and status not in RETRYABLE_CLIENT_STATUSES
+
+# Path to the .wakatime.cfg file.
+WAKATIME_CFG = os.path.expanduser("~/.wakatime.cfg")
+
+
+def load_wakatime_config(config_file: str = WAKATIME_CFG):
+    """Read the .wakatime.cfg file. Returns None if the file doesn't exist."""
+    if not os.path.exists(config_file):
+        print(f"Config file not found: {config_file}")
+        return None
+
+    config = ConfigParser()
+    config.read(config_file)
+    return config
+
+
+def load_api_key(config_file: str = WAKATIME_CFG):
+    """Load the API key from the .wakatime.cfg file."""
+    config = load_wakatime_config(config_file)
+    if config is None:
+        return None
+
+    if 'settings' in config and 'api_key' in config['settings']:
+        return config['settings']['api_key']
+    else:
+        print("API key not found in the configuration file.")
+        return None
+
+
+def build_headers(api_key: str):
+    """Headers used for every request to the heartbeats endpoint."""
+    return {
+        "Authorization": f"Basic {api_key}",
+        "Content-Type": "application/json"
+    }
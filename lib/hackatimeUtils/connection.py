@@ -0,0 +1,401 @@
+# Kept-alive connection to the heartbeats server.
+#
+# The first request after startup, sleep or a network change would otherwise
+# pay for a DNS lookup, the TCP handshake and the TLS handshake before the
+# heartbeats go out. ApiConnection keeps one HTTPS connection open and reuses
+# it, caches DNS answers for a while, and runs a small warmer thread that:
+#   - resolves and connects right after startup
+#   - notices the machine waking up (the wall clock jumps ahead of the
+#     monotonic clock, or the warmer itself wakes up much later than it asked
+#     to) and reconnects with fresh DNS
+#   - notices sockets the server or the network dropped while idle and
+#     replaces them while the add-in is in use
+# so the sender normally finds a warm connection. Requests are only ever made
+# by the caller's thread, the warmer never sends anything.
+#
+# The warmer connects without holding the connection lock and only swaps the
+# new connection in afterwards, and DNS lookups give up after the request
+# timeout, so a slow network never makes a request (or add-in shutdown) wait
+# longer than its own timeout.
+
+import http.client
+import socket
+import ssl
+import threading
+import time
+
+DEFAULT_DNS_TTL = 300
+
+# Seconds between warmer checks.
+CHECK_INTERVAL = 15
+
+# Seconds a connection may sit unused before it is assumed the server closed
+# it. Most servers drop idle keep-alive connections after 60 to 75 seconds.
+IDLE_TIMEOUT = 50
+
+# The warmer only replaces dropped connections while the add-in was used in
+# this many seconds, an idle Fusion doesn't keep reconnecting all night.
+KEEP_WARM_FOR = 15 * 60
+
+# Seconds the wall clock may run ahead of the monotonic clock (or a check may
+# be late) before it counts as the machine having slept.
+RESUME_THRESHOLD = 30
+
+# Errors that mean a reused connection was closed underneath us, the request
+# is retried once on a new connection.
+STALE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionResetError,
+                ConnectionAbortedError, BrokenPipeError)
+
+
+class DNSCache:
+    """getaddrinfo results per (host, port), kept for `ttl` seconds.
+
+    When a lookup fails the expired answer is used rather than failing the
+    request, the address rarely changes and DNS is often the first thing to
+    break on flaky networks.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_DNS_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}  # (host, port) -> (expires, addresses)
+        self._lookups = {}  # (host, port) -> lookup thread still running
+
+    def resolve(self, host: str, port: int, timeout: float = None):
+        """Addresses for host and port. Raises socket.timeout if a lookup takes
+        longer than timeout seconds and there is no expired answer to fall back on.
+        """
+        key = (host, port)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and time.monotonic() < entry[0]:
+            return entry[1]
+
+        try:
+            addresses = self._lookup(key, timeout)
+        except OSError:
+            if entry is not None:
+                return entry[1]
+            raise
+        return addresses
+
+    def _lookup(self, key, timeout):
+        # getaddrinfo can't be cancelled or given a timeout, so it runs on its
+        # own thread. A lookup that runs over still fills the cache when it
+        # finishes, and later calls wait for it rather than starting another.
+        with self._lock:
+            lookup = self._lookups.get(key)
+            if lookup is None:
+                lookup = _Lookup(self, key)
+                self._lookups[key] = lookup
+                lookup.start()
+        lookup.join(timeout)
+        if lookup.is_alive():
+            raise socket.timeout(f"DNS lookup for {key[0]} timed out")
+        if lookup.error is not None:
+            raise lookup.error
+        return lookup.addresses
+
+    def _finished(self, lookup):
+        with self._lock:
+            if lookup.addresses is not None:
+                self._entries[lookup.key] = (time.monotonic() + self.ttl, lookup.addresses)
+            if self._lookups.get(lookup.key) is lookup:
+                del self._lookups[lookup.key]
+
+    def expires_in(self, host: str, port: int):
+        """Seconds until the cached answer expires, 0 if there is none."""
+        with self._lock:
+            entry = self._entries.get((host, port))
+        return max(0.0, entry[0] - time.monotonic()) if entry else 0.0
+
+    def invalidate(self):
+        with self._lock:
+            self._entries = {}
+
+
+class _Lookup(threading.Thread):
+    """One getaddrinfo call on a daemon thread."""
+
+    def __init__(self, cache, key):
+        super().__init__(name="HackatimeDNS", daemon=True)
+        self.cache = cache
+        self.key = key
+        self.addresses = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.addresses = socket.getaddrinfo(*self.key, type=socket.SOCK_STREAM)
+        except OSError as e:
+            self.error = e
+        finally:
+            self.cache._finished(self)
+
+
+class WakeDetector:
+    """Tells when the machine was asleep, or the clock jumped, since the last check."""
+
+    def __init__(self, threshold: float = RESUME_THRESHOLD):
+        self.threshold = threshold
+        self._wall = time.time()
+        self._monotonic = time.monotonic()
+
+    def check(self, expected_interval: float = 0.0):
+        wall, monotonic = time.time(), time.monotonic()
+        elapsed = monotonic - self._monotonic
+        # On some systems the monotonic clock stops during sleep and the wall
+        # clock doesn't, on others both run but the check comes in late.
+        drift = (wall - self._wall) - elapsed
+        late = elapsed - expected_interval
+        self._wall, self._monotonic = wall, monotonic
+        return abs(drift) > self.threshold or late > self.threshold
+
+
+def split_host(host: str, default_port: int = 443):
+    """Split "host" or "host:port" into (host, port)."""
+    name, separator, port = host.rpartition(":")
+    if separator and port.isdigit() and "]" not in port:
+        return name.strip("[]"), int(port)
+    return host, default_port
+
+
+class ApiConnection:
+    """One reusable HTTPS connection to `host` with cached DNS and a warmer thread."""
+
+    def __init__(self, host: str, timeout: float = 10, dns_ttl: float = DEFAULT_DNS_TTL,
+                 check_interval: float = CHECK_INTERVAL, idle_timeout: float = IDLE_TIMEOUT):
+        self.host = host
+        self.hostname, self.port = split_host(host)
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self.idle_timeout = idle_timeout
+        self.dns = DNSCache(dns_ttl)
+
+        # Held while a request uses the connection and while it is swapped, never
+        # while the warmer connects.
+        self._lock = threading.Lock()
+        self._conn = None
+        self._last_used = 0.0
+        self._last_request = time.monotonic()
+        self._epoch = 0  # Bumped by close(), a connect started before that is thrown away
+        self._close_after_request = False
+
+        self._warmer = None
+        self._stopping = threading.Event()
+        self._wake = WakeDetector()
+
+    # Requests
+
+    def request(self, method: str, path: str, body=None, headers=None, timeout: float = None):
+        """Make a request and return (status, body text).
+
+        Waiting for the connection, connecting and the request itself all count
+        towards timeout. A kept-alive connection that turns out to be closed is
+        replaced and the request retried once. Any other error is raised.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        if not self._lock.acquire(timeout=max(0.0, timeout)):
+            raise socket.timeout(f"Connection to {self.host} is busy")
+        try:
+            self._last_request = time.monotonic()
+            for attempt in range(2):
+                reused = attempt == 0 and not self._is_stale_locked()
+                if not reused:
+                    self._close_locked()
+                    self._conn = self._connect(deadline)
+                    self._last_used = time.monotonic()
+                conn = self._conn
+                conn.sock.settimeout(_remaining(deadline))
+                try:
+                    conn.request(method, path, body=body, headers=headers or {})
+                    response = conn.getresponse()
+                    text = response.read().decode(errors="replace")
+                except STALE_ERRORS:
+                    self._close_locked()
+                    if not reused:
+                        raise
+                    continue
+                except Exception:
+                    self._close_locked()
+                    raise
+                self._last_used = time.monotonic()
+                if response.will_close:
+                    self._close_locked()
+                return response.status, text
+        finally:
+            self._release()
+
+    def close(self):
+        """Close the connection without waiting: a request using it closes it
+        when done, a connect in progress is thrown away.
+        """
+        self._epoch += 1
+        if self._lock.acquire(blocking=False):
+            try:
+                self._close_locked()
+            finally:
+                self._lock.release()
+        else:
+            self._close_after_request = True
+
+    # Warming
+
+    def start(self):
+        """Start the warmer thread, which connects right away."""
+        if self._warmer is not None:
+            return
+        # A fresh event per warmer, so one left running by stop() never picks up a later start().
+        self._stopping = threading.Event()
+        self._wake = WakeDetector()
+        self._warmer = threading.Thread(target=self._warm_loop, args=(self._stopping,), name="HackatimeWarmer",
+                                        daemon=True)
+        self._warmer.start()
+
+    def stop(self, timeout: float = None):
+        """Stop the warmer and close the connection.
+
+        Waits at most timeout seconds for the warmer (its own timeout + 1 by
+        default). A warmer still connecting after that is a daemon thread and
+        drops its connection when it finishes.
+        """
+        if self._warmer is not None:
+            self._stopping.set()
+            self._warmer.join(self.timeout + 1 if timeout is None else max(0.0, timeout))
+            self._warmer = None
+        self.close()
+
+    def prewarm(self):
+        """Resolve the host and connect if there is no usable connection.
+
+        Returns True if a connection is ready. Does nothing while a request is
+        using the connection, which is as warm as it gets.
+        """
+        if not self._lock.acquire(blocking=False):
+            return True
+        try:
+            if not self._is_stale_locked():
+                return True
+            epoch = self._epoch
+        finally:
+            self._release()
+
+        try:
+            conn = self._connect(time.monotonic() + self.timeout)
+        except (OSError, http.client.HTTPException) as e:
+            print(f"Could not pre-connect to {self.host}: {e}")
+            return False
+
+        # Only swap the new connection in if nothing closed or replaced the old one meanwhile.
+        if self._lock.acquire(blocking=False):
+            try:
+                if epoch == self._epoch and self._is_stale_locked():
+                    self._close_locked()
+                    self._conn = conn
+                    self._last_used = time.monotonic()
+                    return True
+            finally:
+                self._release()
+        conn.close()
+        return True
+
+    def _warm_loop(self, stopping):
+        self.prewarm()
+        while not stopping.wait(self.check_interval):
+            if self._wake.check(self.check_interval):
+                # After sleep the old socket and maybe the address are no good.
+                print(f"Resumed from sleep, reconnecting to {self.host}")
+                self.dns.invalidate()
+                self.close()
+                self.prewarm()
+                continue
+
+            if time.monotonic() - self._last_request > KEEP_WARM_FOR:
+                continue
+            # Refresh DNS before it expires rather than on the next request.
+            if self.dns.expires_in(self.hostname, self.port) < self.check_interval:
+                try:
+                    self.dns.resolve(self.hostname, self.port, self.timeout)
+                except OSError:
+                    pass
+            self.prewarm()
+
+    # Connecting, no lock needed
+
+    def _connect(self, deadline):
+        """A new connection, connected within deadline (a time.monotonic() value)."""
+        # Looked up at call time so tools can swap in plain HTTP.
+        conn = http.client.HTTPSConnection(self.host, timeout=_remaining(deadline))
+        conn._create_connection = lambda address, timeout, source_address=None: self._create_socket(
+            address, deadline, source_address)
+        try:
+            conn.connect()
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def _create_socket(self, address, deadline, source_address=None):
+        """Like socket.create_connection, with addresses from the DNS cache."""
+        host, port = address
+        error = None
+        for family, type, proto, _, sockaddr in self.dns.resolve(host, port, _remaining(deadline)):
+            sock = socket.socket(family, type, proto)
+            try:
+                sock.settimeout(_remaining(deadline))
+                if source_address:
+                    sock.bind(source_address)
+                sock.connect(sockaddr)
+                return sock
+            except OSError as e:
+                sock.close()
+                error = e
+        # None of the cached addresses work, look them up again next time.
+        self.dns.invalidate()
+        raise error or OSError(f"No addresses for {host}")
+
+    # Connection handling, always with the lock held
+
+    def _is_stale_locked(self):
+        conn = self._conn
+        if conn is None or conn.sock is None:
+            return True
+        if time.monotonic() - self._last_used > self.idle_timeout:
+            return True
+        # Nothing but TLS session tickets should arrive on an idle keep-alive
+        # connection, and TLS 1.3 servers send those right after the handshake,
+        # so a readable socket doesn't mean much. A non-blocking read handles
+        # the tickets and tells a live connection (nothing to read) from one
+        # the server closed (b'') or sent junk on.
+        sock = conn.sock
+        try:
+            previous = sock.gettimeout()
+            sock.setblocking(False)
+            try:
+                sock.recv(1)
+            finally:
+                sock.settimeout(previous)
+            # Data on an idle connection, or b'' because the server closed it.
+            return True
+        except (ssl.SSLWantReadError, ssl.SSLWantWriteError, BlockingIOError):
+            return False
+        except (OSError, ValueError):
+            return True
+
+    def _close_locked(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _release(self):
+        """Release the lock, closing the connection first if close() was called meanwhile."""
+        if self._close_after_request:
+            self._close_after_request = False
+            self._close_locked()
+        self._lock.release()
+
+
+def _remaining(deadline):
+    """Seconds left until deadline, at least a little so a socket timeout is never 0."""
+    return max(0.01, deadline - time.monotonic())
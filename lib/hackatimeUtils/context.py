@@ -0,0 +1,62 @@
+# What the user is working on: project, document, workspace and component.
+#
+# Reading these from the Fusion API costs several calls into Fusion, far more
+# than the rest of a command heartbeat. The add-in reads them only when they can
+# change (a document is activated, a workspace is switched) and keeps the result
+# in an immutable ActivityContext. Heartbeats share the current context object,
+# so attaching it to every heartbeat costs one reference, and its payload
+# fields are built once per context rather than once per heartbeat.
+
+import sys
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+class ActivityContext:
+    """Snapshot of the active project, document, workspace and component. Never modified."""
+
+    __slots__ = ("project", "document", "workspace", "component", "_fields")
+
+    def __init__(self, project: str = None, document: str = None, workspace: str = None, component: str = None):
+        self.project = _intern(project)
+        self.document = _intern(document)
+        self.workspace = _intern(workspace)
+        self.component = _intern(component)
+        self._fields = None
+
+    def replace(self, **changes):
+        """Return a copy with some fields changed, or this context if nothing changes."""
+        values = {name: getattr(self, name) for name in ("project", "document", "workspace", "component")}
+        if all(values[name] == value for name, value in changes.items()):
+            return self
+        values.update(changes)
+        return ActivityContext(**values)
+
+    def payload_fields(self):
+        """Heartbeat fields for this context. The component goes in branch, which
+        WakaTime compatible dashboards already break project time down by."""
+        if self._fields is None:
+            fields = {}
+            if self.workspace:
+                fields["workspace"] = self.workspace
+            if self.component:
+                fields["branch"] = self.component
+            self._fields = fields
+        return self._fields
+
+    def __eq__(self, other):
+        return isinstance(other, ActivityContext) and (
+            (self.project, self.document, self.workspace, self.component)
+            == (other.project, other.document, other.workspace, other.component))
+
+    def __hash__(self):
+        return hash((self.project, self.document, self.workspace, self.component))
+
+    def __repr__(self):
+        return (f"ActivityContext(project={self.project!r}, document={self.document!r}, "
+                f"workspace={self.workspace!r}, component={self.component!r})")
+
+
+EMPTY_CONTEXT = ActivityContext()
@@ -0,0 +1,145 @@
+# Privacy filters from the [settings] section of .wakatime.cfg.
+#
+#   exclude = one regex per line, heartbeats that match are never sent
+#   include = one regex per line, overrides exclude
+#   hide_file_names = true, or one regex per line, replaces matching entity names
+#   hide_project_names = true, or one regex per line, replaces matching project names
+#
+# Fusion has no file paths, so patterns are matched against "project/entity",
+# for example "Client Work/Gearbox v3". Matching is case insensitive like the
+# WakaTime plugins.
+#
+# Every list of patterns is compiled into one alternation so a heartbeat is
+# checked with a single regex search per rule instead of one per pattern, and
+# the outcome is memoized per project and entity, so after the first heartbeat
+# for a document the filter costs a dict lookup. Patterns that can't be joined
+# (inline flags like (?i), backreferences, clashing group names) are searched
+# one by one instead, which the memoizing keeps just as cheap after the first time.
+
+import hashlib
+import re
+
+HIDDEN_ENTITY = "HIDDEN"
+
+# Inline global flags at the start of a pattern, and backreferences, which would
+# break or be renumbered when patterns are joined.
+_UNJOINABLE = re.compile(r"^\(\?[aiLmsux]+\)|\\[1-9]|\(\?P=")
+
+# Memoized results kept before the cache is cleared and rebuilt.
+CACHE_SIZE = 4096
+
+_TRUE = ("true", "yes", "on", "1")
+_FALSE = ("false", "no", "off", "0", "")
+
+
+def _patterns(value):
+    """Split a multi line .wakatime.cfg value into patterns. Returns True for "true"."""
+    if value is None:
+        return ()
+    stripped = value.strip()
+    if stripped.lower() in _TRUE:
+        return True
+    if stripped.lower() in _FALSE:
+        return ()
+    return tuple(line.strip() for line in stripped.splitlines() if line.strip())
+
+
+class _PatternList:
+    """Patterns searched one at a time, for lists that can't be joined into one regex."""
+
+    def __init__(self, regexes):
+        self.regexes = tuple(regexes)
+
+    def search(self, subject):
+        for regex in self.regexes:
+            match = regex.search(subject)
+            if match:
+                return match
+        return None
+
+
+def _compile(patterns):
+    """Compile patterns into one regex, or a _PatternList if they can't be joined.
+    True matches everything, no patterns match nothing.
+    """
+    if patterns is True:
+        return re.compile("")
+
+    valid = []
+    for pattern in patterns:
+        try:
+            regex = re.compile(pattern, re.IGNORECASE)
+        except re.error as e:
+            print(f"Ignoring invalid pattern {pattern!r} in .wakatime.cfg: {e}")
+            continue
+        valid.append((pattern, regex))
+
+    if not valid:
+        return None
+    if len(valid) == 1:
+        return valid[0][1]
+    if not any(_UNJOINABLE.search(pattern) for pattern, _ in valid):
+        try:
+            return re.compile("|".join(f"(?:{pattern})" for pattern, _ in valid), re.IGNORECASE)
+        except re.error:
+            pass
+    return _PatternList(regex for _, regex in valid)
+
+
+def hidden_project_name(project: str):
+    """A stable stand-in for a hidden project so time still adds up per project."""
+    digest = hashlib.sha1(project.encode("utf-8")).hexdigest()[:8]
+    return f"Hidden Project {digest}"
+
+
+class HeartbeatFilter:
+    """Decides whether a heartbeat may be sent and which names it may carry."""
+
+    def __init__(self, exclude=(), include=(), hide_file_names=(), hide_project_names=()):
+        self._exclude = _compile(exclude)
+        self._include = _compile(include)
+        self._hide_file_names = _compile(hide_file_names)
+        self._hide_project_names = _compile(hide_project_names)
+        self._cache = {}
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the filter from a ConfigParser of .wakatime.cfg. None gives a filter that lets everything through."""
+        if config is None or "settings" not in config:
+            return cls()
+
+        settings = config["settings"]
+        return cls(
+            exclude=_patterns(settings.get("exclude")),
+            include=_patterns(settings.get("include")),
+            # hidefilenames is the older spelling still written by some plugins.
+            hide_file_names=_patterns(settings.get("hide_file_names", settings.get("hidefilenames"))),
+            hide_project_names=_patterns(settings.get("hide_project_names")),
+        )
+
+    def apply(self, project: str, entity: str):
+        """Returns the (project, entity) to send, or None if the heartbeat must be dropped."""
+        key = (project, entity)
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+
+        result = self._evaluate(project, entity)
+        if len(self._cache) >= CACHE_SIZE:
+            self._cache.clear()
+        self._cache[key] = result
+        return result
+
+    def _evaluate(self, project: str, entity: str):
+        subject = f"{project}/{entity}"
+
+        if self._exclude and self._exclude.search(subject):
+            if not (self._include and self._include.search(subject)):
+                return None
+
+        if self._hide_file_names and self._hide_file_names.search(subject):
+            entity = HIDDEN_ENTITY
+        if self._hide_project_names and self._hide_project_names.search(subject):
+            project = hidden_project_name(project)
+        return project, entity
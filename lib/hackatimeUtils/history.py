@@ -0,0 +1,359 @@
+# Local activity history in append-only columns.
+#
+# Every heartbeat the add-in handles is appended to four fixed width column
+# files, one value per heartbeat:
+#
+#   time.f64      seconds since the epoch, float64
+#   project.u32   project id, uint32
+#   entity.u32    entity (document or command) id, uint32
+#   category.u8   category code, uint8
+#
+# Ids index into projects.txt, entities.txt and categories.txt, which hold one
+# name per line in the order names were first seen. Reports memory-map the
+# columns and roll them up with NumPy when it is available (it is not bundled
+# with Fusion's Python), so a year of history is totalled in milliseconds
+# without parsing JSON or creating a Python object per heartbeat. Without NumPy
+# the same rollups run as plain loops over the mapped columns.
+
+import mmap
+import os
+import threading
+import time
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Gaps between heartbeats longer than this are idle time and don't count,
+# like the keystroke timeout of WakaTime compatible servers.
+HEARTBEAT_TIMEOUT = 15 * 60
+
+# Column files and the array typecode / NumPy dtype of each.
+COLUMNS = (
+    ("time", "time.f64", "d", "<f8"),
+    ("project", "project.u32", "I", "<u4"),
+    ("entity", "entity.u32", "I", "<u4"),
+    ("category", "category.u8", "B", "u1"),
+)
+
+NAME_TABLES = (
+    ("project", "projects.txt"),
+    ("entity", "entities.txt"),
+    ("category", "categories.txt"),
+)
+
+# Category codes are a single byte, categories past the last code share it.
+MAX_CATEGORY_CODE = 255
+
+SECONDS_PER_DAY = 86400
+
+
+class ActivityHistory:
+    """Appends heartbeats to the column files and opens them for reports."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._names = None  # column -> list of names, loaded on first append
+        self._ids = None  # column -> {name: id}
+
+    def append(self, records):
+        """Append heartbeat records (anything with time, project, entity and category attributes)."""
+        with self._lock:
+            if self._names is None:
+                self._load_names()
+
+            columns = {name: array(typecode) for name, _, typecode, _ in COLUMNS}
+            new_names = {column: [] for column, _ in NAME_TABLES}
+            for record in records:
+                columns["time"].append(record.time)
+                columns["project"].append(self._id("project", record.project, new_names))
+                columns["entity"].append(self._id("entity", record.entity, new_names))
+                columns["category"].append(min(self._id("category", record.category, new_names), MAX_CATEGORY_CODE))
+
+            if not len(columns["time"]):
+                return 0
+
+            os.makedirs(self.directory, exist_ok=True)
+            # Names go first, so every id in the columns always has its name on disk.
+            for column, file_name in NAME_TABLES:
+                if new_names[column]:
+                    with open(os.path.join(self.directory, file_name), "a", encoding="utf-8") as file:
+                        file.writelines(f"{name}\n" for name in new_names[column])
+            for name, file_name, _, _ in COLUMNS:
+                with open(os.path.join(self.directory, file_name), "ab") as file:
+                    file.write(columns[name].tobytes())
+            return len(columns["time"])
+
+    def open(self):
+        """Map the history for reading. Use the result as a context manager."""
+        return HistoryView(self.directory)
+
+    def _load_names(self):
+        self._names = {column: _read_names(self.directory, file_name) for column, file_name in NAME_TABLES}
+        self._ids = {column: {name: i for i, name in enumerate(names)} for column, names in self._names.items()}
+
+    def _id(self, column, name, new_names):
+        ids = self._ids[column]
+        id = ids.get(name)
+        if id is None:
+            # Names can't contain line breaks, the tables are one name per line.
+            name = name.replace("\n", " ").replace("\r", " ")
+            id = ids.get(name)
+            if id is None:
+                id = len(self._names[column])
+                self._names[column].append(name)
+                ids[name] = id
+                new_names[column].append(name)
+        return id
+
+
+def _read_names(directory, file_name):
+    path = os.path.join(directory, file_name)
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as file:
+        return [line.rstrip("\n") for line in file]
+
+
+class HistoryView:
+    """Read-only, memory-mapped view of the history with rollups.
+
+    Every rollup takes an optional [since, until) range in epoch seconds and
+    returns seconds of activity.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.names = {column: _read_names(directory, file_name) for column, file_name in NAME_TABLES}
+        self._maps = []
+        self.columns = {}
+
+        sizes = {}
+        for name, file_name, typecode, _ in COLUMNS:
+            path = os.path.join(directory, file_name)
+            sizes[name] = os.path.getsize(path) // array(typecode).itemsize if os.path.exists(path) else 0
+
+        # A write interrupted half way can leave columns of different lengths,
+        # only rows present in every column count.
+        self.count = min(sizes.values())
+        for name, file_name, typecode, dtype in COLUMNS:
+            self.columns[name] = self._map(os.path.join(directory, file_name), typecode, dtype)
+
+        self._durations = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        # Views into the maps must be gone before the maps can close.
+        for column in self.columns.values():
+            if isinstance(column, memoryview):
+                column.release()
+        self.columns = {}
+        self._durations = None
+        for mapped in self._maps:
+            try:
+                mapped.close()
+            except BufferError:
+                pass
+        self._maps = []
+
+    def _map(self, path, typecode, dtype):
+        if not self.count:
+            return np.zeros(0, dtype=dtype) if np is not None else array(typecode)
+
+        itemsize = array(typecode).itemsize
+        with open(path, "rb") as file:
+            mapped = mmap.mmap(file.fileno(), self.count * itemsize, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        if np is not None:
+            return np.frombuffer(mapped, dtype=dtype, count=self.count)
+        return memoryview(mapped).cast(typecode)
+
+    # Rollups
+
+    def durations(self):
+        """Seconds each heartbeat accounts for: the gap to the next one, or nothing
+        if that gap is longer than HEARTBEAT_TIMEOUT. Heartbeats are appended in
+        time order, give or take a flush, so they are sorted first if needed.
+        """
+        if self._durations is not None:
+            return self._durations
+
+        times = self.columns["time"]
+        if np is not None:
+            order = None
+            if self.count > 1 and bool(np.any(times[1:] < times[:-1])):
+                order = np.argsort(times, kind="stable")
+            sorted_times = times if order is None else times[order]
+            gaps = np.diff(sorted_times, append=sorted_times[-1:] if self.count else sorted_times)
+            gaps[gaps > HEARTBEAT_TIMEOUT] = 0.0
+            if order is None:
+                durations = gaps
+            else:
+                durations = np.empty_like(gaps)
+                durations[order] = gaps
+        else:
+            order = sorted(range(self.count), key=times.__getitem__)
+            durations = [0.0] * self.count
+            for current, following in zip(order, order[1:]):
+                gap = times[following] - times[current]
+                durations[current] = gap if gap <= HEARTBEAT_TIMEOUT else 0.0
+
+        self._durations = durations
+        return durations
+
+    def totals_by_project(self, since: float = None, until: float = None):
+        return self._totals_by_name("project", since, until)
+
+    def totals_by_entity(self, since: float = None, until: float = None):
+        return self._totals_by_name("entity", since, until)
+
+    def totals_by_category(self, since: float = None, until: float = None):
+        return self._totals_by_name("category", since, until)
+
+    def totals_by_day(self, since: float = None, until: float = None):
+        """{'YYYY-MM-DD': seconds} in local time."""
+        days = self._local_days()
+        totals = self._bincount(days, since, until)
+        return {time.strftime("%Y-%m-%d", time.gmtime(day * SECONDS_PER_DAY)): seconds
+                for day, seconds in totals.items()}
+
+    def totals_by_week(self, since: float = None, until: float = None):
+        """{'YYYY-MM-DD' of the week's Monday: seconds} in local time."""
+        days = self._local_days()
+        # Day 0 of the epoch was a Thursday, shifting by 3 makes weeks start on Monday.
+        weeks = (days + 3) // 7 if np is not None else [(day + 3) // 7 for day in days]
+        totals = self._bincount(weeks, since, until)
+        return {time.strftime("%Y-%m-%d", time.gmtime((week * 7 - 3) * SECONDS_PER_DAY)): seconds
+                for week, seconds in totals.items()}
+
+    def total(self, since: float = None, until: float = None):
+        durations = self.durations()
+        if np is not None:
+            return float(durations[self._mask(since, until)].sum())
+        times = self.columns["time"]
+        return sum(duration for t, duration in zip(times, durations) if _in_range(t, since, until))
+
+    def _totals_by_name(self, column, since, until):
+        names = self.names[column]
+        totals = self._bincount(self.columns[column], since, until)
+        return {names[id] if id < len(names) else str(id): seconds for id, seconds in totals.items()}
+
+    def _local_days(self):
+        # The current UTC offset is applied to all of history, a DST change
+        # only moves the day boundary of older heartbeats by an hour.
+        offset = time.localtime().tm_gmtoff
+        times = self.columns["time"]
+        if np is not None:
+            return np.floor_divide(times + offset, SECONDS_PER_DAY).astype(np.int64)
+        return [int((t + offset) // SECONDS_PER_DAY) for t in times]
+
+    def _mask(self, since, until):
+        times = self.columns["time"]
+        mask = np.ones(self.count, dtype=bool)
+        if since is not None:
+            mask &= times >= since
+        if until is not None:
+            mask &= times < until
+        return mask
+
+    def _bincount(self, keys, since, until):
+        """Sum durations per key, returning {key: seconds} for keys with activity."""
+        durations = self.durations()
+        if np is not None:
+            if not self.count:
+                return {}
+            mask = self._mask(since, until)
+            keys = np.asarray(keys)[mask]
+            if not len(keys):
+                return {}
+            base = int(keys.min())
+            sums = np.bincount(keys.astype(np.int64) - base, weights=durations[mask])
+            return {base + int(i): float(sums[i]) for i in np.flatnonzero(sums)}
+
+        totals = {}
+        times = self.columns["time"]
+        for t, key, duration in zip(times, keys, durations):
+            if duration and _in_range(t, since, until):
+                totals[key] = totals.get(key, 0.0) + duration
+        return totals
+
+
+def _in_range(t, since, until):
+    return (since is None or t >= since) and (until is None or t < until)
+
+
+def start_of_today():
+    """Epoch seconds of local midnight today."""
+    now = time.localtime()
+    return time.mktime((now.tm_year, now.tm_mon, now.tm_mday, 0, 0, 0, 0, 0, -1))
+
+
+def start_of_week():
+    """Epoch seconds of local midnight on this week's Monday."""
+    now = time.localtime()
+    return time.mktime((now.tm_year, now.tm_mon, now.tm_mday - now.tm_wday, 0, 0, 0, 0, 0, -1))
+
+
+def summarize(directory: str):
+    """Today's and this week's seconds per project, for the palette and reports."""
+    today, week = start_of_today(), start_of_week()
+    with HistoryView(directory) as view:
+        return {
+            "today": view.totals_by_project(since=today),
+            "week": view.totals_by_project(since=week),
+            "today_total": view.total(since=today),
+            "week_total": view.total(since=week),
+        }
+
+
+def history_size(directory: str):
+    """Size in bytes of the time column, which grows with every appended heartbeat."""
+    try:
+        return os.path.getsize(os.path.join(directory, COLUMNS[0][1]))
+    except OSError:
+        return 0
+
+
+class SummaryCache:
+    """summarize() results for a history, computed on a background thread.
+
+    get() never blocks, so it can be called from Fusion's main thread: it
+    returns the last summary and starts recomputing it if heartbeats were
+    appended since or the day rolled over.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._summary = None
+        self._key = None  # (history size, start of today) the summary was computed for
+        self._thread = None
+
+    def get(self):
+        """Return (summary or None before the first one is ready, whether it is up to date)."""
+        key = (history_size(self.directory), start_of_today())
+        with self._lock:
+            fresh = key == self._key
+            if not fresh and (self._thread is None or not self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._refresh, args=(key,), name="HackatimeSummary",
+                                                daemon=True)
+                self._thread.start()
+            return self._summary, fresh
+
+    def _refresh(self, key):
+        try:
+            summary = summarize(self.directory)
+        except Exception as e:
+            # Left stale, the next get() tries again.
+            print(f"Could not summarize the activity history: {e}")
+            return
+        with self._lock:
+            self._summary, self._key = summary, key
@@ -0,0 +1,95 @@
+# On demand profiling of the add-in.
+#
+# cProfile only runs while one of the add-in's event handlers is executing
+# (fusionAddInUtils calls enter() and exit() around every handler), so the
+# profile shows the add-in's own cost rather than everything Fusion does in
+# between. tracemalloc can't be scoped per call, it traces the whole process
+# while profiling and the report is filtered down to the add-in's files.
+
+import cProfile
+import io
+import os
+import pstats
+import time
+import tracemalloc
+
+# The add-in folder, allocations are only reported for files under it.
+ADDIN_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Frames kept per allocation traceback.
+TRACEMALLOC_FRAMES = 10
+
+# Lines shown in each section of the text report.
+REPORT_LIMIT = 25
+
+
+class HandlerProfiler:
+    """cProfile and tracemalloc for the add-in's handlers over a time window."""
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.profile = cProfile.Profile()
+        self.started = None
+        self._depth = 0
+        self._started_tracemalloc = False
+        self._first_snapshot = None
+
+    def start(self):
+        self.started = time.time()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracemalloc = True
+        self._first_snapshot = self._snapshot()
+
+    def enter(self):
+        """Called before a handler runs. Handlers can nest, only the outermost one toggles cProfile."""
+        if self._depth == 0:
+            self.profile.enable()
+        self._depth += 1
+
+    def exit(self):
+        """Called after a handler ran."""
+        self._depth -= 1
+        if self._depth == 0:
+            self.profile.disable()
+
+    def finish(self):
+        """Stop profiling and write the .prof file and the text report. Returns both paths."""
+        self.profile.disable()
+        last_snapshot = self._snapshot()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        name = time.strftime("profile-%Y%m%d-%H%M%S", time.localtime(self.started))
+        profile_path = os.path.join(self.output_dir, name + ".prof")
+        report_path = os.path.join(self.output_dir, name + ".txt")
+
+        self.profile.dump_stats(profile_path)
+        with open(report_path, "w", encoding="utf-8") as file:
+            file.write(self._report(last_snapshot, profile_path))
+        return profile_path, report_path
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(True, os.path.join(ADDIN_DIR, "*"))])
+
+    def _report(self, last_snapshot, profile_path):
+        out = io.StringIO()
+        out.write(f"Hackatime add-in profile, {time.time() - self.started:.0f} seconds\n")
+        out.write(f"cProfile data: {profile_path}\n\n")
+
+        out.write(f"== Top {REPORT_LIMIT} functions by cumulative time in add-in handlers ==\n")
+        try:
+            stats = pstats.Stats(self.profile, stream=out)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(REPORT_LIMIT)
+        except TypeError:
+            out.write("No handler ran while profiling.\n")
+
+        out.write(f"\n== Top {REPORT_LIMIT} allocations still held by the add-in ==\n")
+        for stat in last_snapshot.statistics("lineno")[:REPORT_LIMIT]:
+            out.write(f"{stat}\n")
+
+        out.write(f"\n== Top {REPORT_LIMIT} allocation changes while profiling ==\n")
+        for stat in last_snapshot.compare_to(self._first_snapshot, "lineno")[:REPORT_LIMIT]:
+            out.write(f"{stat}\n")
+        return out.getvalue()
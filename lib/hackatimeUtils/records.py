@@ -0,0 +1,132 @@
+# Compact in-memory heartbeats.
+#
+# Heartbeats wait in memory until the sender flushes them, so they are kept as
+# small __slots__ records instead of dicts. Project, entity and category names
+# repeat constantly and are interned so every record shares the same string
+# objects. Fields that are the same for every heartbeat (editor, operating
+# system...) are not stored at all and only merged in when a record is turned
+# into its JSON payload at flush time.
+
+import collections
+import sys
+import threading
+
+from .sent_set import heartbeat_id
+
+# What HeartbeatBuffer does when it is full.
+OVERFLOW_SPILL = "spill"  # Hand the oldest records to the spill callback (the offline queue)
+OVERFLOW_DROP_OLDEST = "drop_oldest"  # Forget the oldest records
+OVERFLOW_DROP_NEWEST = "drop_newest"  # Refuse the new record
+OVERFLOW_POLICIES = (OVERFLOW_SPILL, OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST)
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+class HeartbeatRecord:
+    """A heartbeat waiting to be sent."""
+
+    __slots__ = ("id", "time", "entity", "project", "type", "category", "extra", "context")
+
+    def __init__(self, time: float, entity: str, project: str, type: str, category: str, extra: dict = None,
+                 context=None):
+        self.time = time
+        self.entity = _intern(entity)
+        self.project = _intern(project)
+        self.type = _intern(type)
+        self.category = _intern(category)
+        # Extra fields are rare and tiny, a tuple of pairs is cheaper than a dict.
+        self.extra = tuple((_intern(key), _intern(value)) for key, value in extra.items()) if extra else None
+        # The ActivityContext the heartbeat happened in, shared with every other heartbeat in it.
+        self.context = context
+        # Derived from the content, so retries and replays of this heartbeat share it.
+        self.id = heartbeat_id(time, entity, project, type, category)
+
+    def to_dict(self, common: dict = None):
+        """Build the JSON payload for this heartbeat, merging in the fields common to all heartbeats."""
+        payload = {
+            "time": self.time,
+            "entity": self.entity,
+            "project": self.project,
+            "type": self.type,
+            "category": self.category,
+        }
+        if common:
+            payload.update(common)
+        if self.context is not None:
+            payload.update(self.context.payload_fields())
+        if self.extra:
+            payload.update(self.extra)
+        return payload
+
+    def __repr__(self):
+        return f"HeartbeatRecord({self.to_dict()!r})"
+
+
+class HeartbeatBuffer:
+    """Thread safe FIFO of heartbeat records with a hard size cap.
+
+    Arguments:
+    max_records -- The most records held in memory at once.
+    overflow -- One of OVERFLOW_POLICIES, what to do when a record arrives and the buffer is full.
+    spill -- Called with a list of records when the spill policy evicts them. Evictions
+             happen in chunks of a quarter of the buffer so spilling costs one write
+             now and then rather than one per heartbeat.
+    """
+
+    def __init__(self, max_records: int = 10000, overflow: str = OVERFLOW_SPILL, spill=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        if overflow == OVERFLOW_SPILL and spill is None:
+            raise ValueError("The spill overflow policy needs a spill callback.")
+
+        self.max_records = max(1, max_records)
+        self.overflow = overflow
+        self.spill = spill
+        self.dropped = 0
+        self.spilled = 0
+        self._records = collections.deque()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._records)
+
+    def append(self, record: HeartbeatRecord):
+        """Add a record. Returns False if it was refused because the buffer is full."""
+        evicted = None
+        with self._lock:
+            if len(self._records) >= self.max_records:
+                if self.overflow == OVERFLOW_DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                evicted = self._evict_locked()
+            self._records.append(record)
+
+        if evicted:
+            self.spill(evicted)
+        return True
+
+    def take(self, count: int):
+        """Remove and return up to count of the oldest records."""
+        with self._lock:
+            count = min(count, len(self._records))
+            return [self._records.popleft() for _ in range(count)]
+
+    def drain(self):
+        """Remove and return every record."""
+        with self._lock:
+            records = list(self._records)
+            self._records.clear()
+            return records
+
+    def _evict_locked(self):
+        if self.overflow == OVERFLOW_DROP_OLDEST:
+            self._records.popleft()
+            self.dropped += 1
+            return None
+
+        count = max(1, self.max_records // 4)
+        evicted = [self._records.popleft() for _ in range(min(count, len(self._records)))]
+        self.spilled += len(evicted)
+        return evicted
@@ -0,0 +1,83 @@
+# Adaptive flush scheduling for the heartbeat sender.
+#
+# The sender has two lanes. Saves go into the priority lane and are flushed as
+# soon as they arrive. Everything else (commands, document switches) goes into
+# the regular lane, which rides along with priority flushes when there is room
+# and otherwise aims for full batches: it is flushed as soon as a full batch is
+# waiting, or after `interval` seconds at the latest so heartbeats don't sit in
+# memory for long when activity is slow.
+#
+# Batch size and interval are tuned AIMD style from every request:
+#   - a success grows the batch by one, up to max_batch_size (the most a bulk
+#     request may hold), so requests get fuller as long as the server keeps up
+#   - a fast success brings a backed off interval back towards the base
+#     interval, never below it, a fast network is no reason to send more often
+#   - a slow success stretches the interval by half, so a slow network gets
+#     fewer, fuller requests
+#   - a failure halves the batch and doubles the interval, backing off quickly
+#     from a struggling server
+#   - while the smoothed error rate is above MAX_ERROR_RATE successes don't grow
+#     the batch or shorten the interval, so a flaky server isn't pushed straight
+#     back to where it failed
+
+import threading
+import time
+
+from .api import MAX_BATCH_SIZE
+
+# Weight of the newest sample in the moving averages.
+SMOOTHING = 0.2
+
+# Smoothed share of failed requests above which the scheduler holds off growing.
+# One failure lifts it to 0.2, it takes four successes in a row to get back below.
+MAX_ERROR_RATE = 0.1
+
+
+class AdaptiveFlushScheduler:
+    """Tracks round trip time and error rate and derives batch size and flush interval."""
+
+    def __init__(self, interval: float = 30, max_interval: float = 300,
+                 batch_size: int = 10, min_batch_size: int = 1, max_batch_size: int = MAX_BATCH_SIZE,
+                 target_rtt: float = 1.0):
+        self.max_interval = max(interval, max_interval)
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max(batch_size, max_batch_size)
+        self.target_rtt = target_rtt
+
+        self.base_interval = interval  # Longest a regular heartbeat waits while the server is healthy
+        self.interval = interval
+        self.batch_size = min(max(batch_size, min_batch_size), max_batch_size)
+        self.rtt = None  # Smoothed round trip time in seconds
+        self.error_rate = 0.0  # Smoothed share of failed requests
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, ok: bool, rtt: float):
+        """Feed the outcome and round trip time of one request."""
+        with self._lock:
+            self.rtt = rtt if self.rtt is None else self.rtt + SMOOTHING * (rtt - self.rtt)
+            self.error_rate += SMOOTHING * ((0.0 if ok else 1.0) - self.error_rate)
+
+            if not ok:
+                self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+                self.interval = min(self.max_interval, self.interval * 2)
+                return
+
+            if self.rtt > self.target_rtt:
+                self.interval = min(self.max_interval, self.interval * 1.5)
+            if self.error_rate > MAX_ERROR_RATE:
+                return
+            self.batch_size = min(self.max_batch_size, self.batch_size + 1)
+            if self.rtt <= self.target_rtt:
+                self.interval = max(self.base_interval, self.interval / 1.5)
+
+    def time_until_flush(self):
+        """Seconds until the regular lane is due."""
+        return max(0.0, self._last_flush + self.interval - time.monotonic())
+
+    def is_due(self):
+        return self.time_until_flush() <= 0
+
+    def flushed(self):
+        """Call after the regular lane was flushed to start the next interval."""
+        self._last_flush = time.monotonic()
@@ -0,0 +1,200 @@
+# Heartbeat ids and the set of ids that were already delivered.
+#
+# A heartbeat id is a hash of the fields that make a heartbeat unique, so the
+# same heartbeat always gets the same id no matter how often it is retried or
+# replayed. The sent set remembers delivered ids in Bloom filters, one per day,
+# kept on disk next to the offline queue. A lookup costs a few bit tests and the
+# memory used is fixed by the filter size, not by how much history there is.
+# A Bloom filter can report a false positive (an id it never saw), which would
+# skip that one heartbeat; with the defaults below that is about 1 in 1000.
+#
+# Saving only writes the bytes that changed since the last save, a few hundred
+# bytes per batch rather than the whole filter. Bits are only ever set, so a
+# save cut short leaves a filter that is missing some ids, never a wrong one.
+
+import hashlib
+import math
+import os
+import threading
+import time
+
+# Fields that identify a heartbeat. Fields shared by all heartbeats are left out.
+ID_FIELDS = ("time", "entity", "project", "type", "category")
+
+# Days of filters kept and consulted when checking an id, today included.
+# Duplicates come from retries and replays shortly after a partial failure, so
+# a few days is plenty. Older filters are deleted when the day rolls over.
+KEEP_DAYS = 3
+
+DEFAULT_CAPACITY = 100000
+DEFAULT_ERROR_RATE = 0.001
+
+# Changed bytes closer together than this are written in one go.
+MERGE_GAP = 64
+
+FILE_PREFIX = "sent-"
+FILE_SUFFIX = ".bloom"
+
+
+def heartbeat_id(time: float, entity: str, project: str, type: str, category: str):
+    """Deterministic id of a heartbeat, 32 hex characters."""
+    key = "\x1f".join((repr(float(time)), entity or "", project or "", type or "", category or ""))
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def payload_id(payload: dict):
+    """heartbeat_id of a heartbeat payload dict, for example one read back from the store."""
+    return heartbeat_id(*(payload.get(field) for field in ID_FIELDS))
+
+
+class BloomFilter:
+    """Fixed size Bloom filter over heartbeat ids."""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, error_rate: float = DEFAULT_ERROR_RATE, bits: bytes = None):
+        size = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.size = max(8, size)
+        self.hash_count = max(1, int(round(self.size / capacity * math.log(2))))
+        byte_count = (self.size + 7) // 8
+        self.bits = bytearray(bits) if bits is not None and len(bits) == byte_count else bytearray(byte_count)
+        self.changed = set()  # Indexes of bytes changed since the last save
+
+    def _positions(self, id: str):
+        # Double hashing: the two 64 bit halves of the id give every probe position.
+        first = int(id[:16], 16)
+        second = int(id[16:], 16) | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, id: str):
+        bits = self.bits
+        for position in self._positions(id):
+            index, mask = position >> 3, 1 << (position & 7)
+            if not bits[index] & mask:
+                bits[index] |= mask
+                self.changed.add(index)
+
+    def __contains__(self, id: str):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(id))
+
+
+def _ranges(indexes):
+    """Sorted (start, end) byte ranges covering indexes, merging close ones."""
+    ranges = []
+    for index in sorted(indexes):
+        if ranges and index - ranges[-1][1] < MERGE_GAP:
+            ranges[-1][1] = index + 1
+        else:
+            ranges.append([index, index + 1])
+    return ranges
+
+
+class SentSet:
+    """Delivered heartbeat ids, one Bloom filter per local day persisted in directory."""
+
+    def __init__(self, directory: str, capacity: int = DEFAULT_CAPACITY, error_rate: float = DEFAULT_ERROR_RATE):
+        self.directory = directory
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._filters = {}  # day -> BloomFilter, loaded lazily
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def add(self, ids):
+        """Remember delivered ids in today's filter."""
+        with self._lock:
+            day = self._today_locked()
+            bloom = self._filter_locked(day, create=True)
+            for id in ids:
+                bloom.add(id)
+            self._dirty.add(day)
+
+    def __contains__(self, id: str):
+        with self._lock:
+            today = self._today_locked()
+            for day in self._days(today):
+                bloom = self._filter_locked(day)
+                if bloom is not None and id in bloom:
+                    return True
+            return False
+
+    def save(self):
+        """Write the bytes of the filters that changed since the last save to disk."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            if not dirty:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            for day in dirty:
+                bloom = self._filters.get(day)
+                if bloom is None:
+                    continue
+                changed, bloom.changed = bloom.changed, set()
+                path = self._path(day)
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    size = None
+
+                if size == len(bloom.bits):
+                    with open(path, "r+b") as file:
+                        for start, end in _ranges(changed):
+                            file.seek(start)
+                            file.write(bloom.bits[start:end])
+                else:
+                    # New filter, or the file doesn't match it: write all of it.
+                    temp_path = path + ".tmp"
+                    with open(temp_path, "wb") as file:
+                        file.write(bloom.bits)
+                    os.replace(temp_path, path)
+
+    def _today_locked(self):
+        today = time.strftime("%Y%m%d")
+        if today not in self._filters:
+            self._rotate_locked(today)
+        return today
+
+    def _rotate_locked(self, today):
+        """Forget filters that fell out of the KEEP_DAYS window, in memory and on disk."""
+        keep = set(self._days(today))
+        for day in list(self._filters):
+            if day not in keep:
+                del self._filters[day]
+                self._dirty.discard(day)
+
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.startswith(FILE_PREFIX) and name.endswith(FILE_SUFFIX):
+                if name[len(FILE_PREFIX):-len(FILE_SUFFIX)] not in keep:
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except OSError:
+                        pass
+
+    def _days(self, today):
+        noon = time.mktime(time.strptime(today + "12", "%Y%m%d%H"))
+        return [time.strftime("%Y%m%d", time.localtime(noon - 86400 * offset)) for offset in range(KEEP_DAYS)]
+
+    def _filter_locked(self, day, create=False):
+        """The filter for day, loaded from disk on first use. None if there is
+        nothing recorded for that day and create is False.
+        """
+        if day in self._filters:
+            bloom = self._filters[day]
+            if bloom is not None or not create:
+                return bloom
+
+        bits = None
+        path = self._path(day)
+        if os.path.exists(path):
+            with open(path, "rb") as file:
+                bits = file.read()
+        elif not create:
+            self._filters[day] = None
+            return None
+
+        bloom = BloomFilter(self.capacity, self.error_rate, bits)
+        self._filters[day] = bloom
+        return bloom
+
+    def _path(self, day):
+        return os.path.join(self.directory, f"{FILE_PREFIX}{day}{FILE_SUFFIX}")
@@ -0,0 +1,186 @@
+# Read-only stats endpoint on localhost.
+#
+# Serves today's and this week's activity totals per project and document as
+# JSON, so local dashboards can show Fusion time without each of them calling
+# the Hackatime server. It is off unless config.STATS_SERVER is set.
+#
+#   GET http://127.0.0.1:<port>/stats
+#
+# The server only ever binds to 127.0.0.1 and runs on its own threads. Requests
+# whose Host header isn't 127.0.0.1 or localhost are refused, so a web page can't
+# reach the endpoint through DNS rebinding and read project names. Totals
+# are computed from the local activity history (see history.py), never from
+# the Fusion API, so a request never touches Fusion's main thread. Computed
+# totals are cached for a few seconds and carry an ETag: a dashboard polling
+# with If-None-Match gets an empty 304 until something changed.
+
+import hashlib
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import history
+
+HOST = "127.0.0.1"
+DEFAULT_PORT = 8787
+DEFAULT_TTL = 30
+
+STATS_PATHS = ("/", "/stats")
+
+ALLOWED_HOSTS = ("127.0.0.1", "localhost")
+
+
+class StatsCache:
+    """Activity totals rendered to JSON, recomputed at most once per `ttl` seconds.
+
+    When the TTL runs out the history's size is checked first, totals are only
+    recomputed if heartbeats were appended since (or the day rolled over).
+    """
+
+    def __init__(self, directory: str, ttl: float = DEFAULT_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._body = None
+        self._etag = None
+        self._expires = 0.0
+        self._key = None  # (history size, start of today) the body was computed for
+
+    def get(self):
+        """Return (body bytes, etag) for the current totals."""
+        with self._lock:
+            now = time.monotonic()
+            if self._body is not None and now < self._expires:
+                return self._body, self._etag
+
+            key = (history.history_size(self.directory), history.start_of_today())
+            if self._body is None or key != self._key:
+                self._body = self._render()
+                self._etag = '"' + hashlib.blake2b(self._body, digest_size=12).hexdigest() + '"'
+                self._key = key
+            self._expires = now + self.ttl
+            return self._body, self._etag
+
+    def _render(self):
+        today, week = history.start_of_today(), history.start_of_week()
+        with history.HistoryView(self.directory) as view:
+            stats = {
+                "today": _period(view, today),
+                "week": _period(view, week),
+            }
+        stats["generated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        return json.dumps(stats, separators=(",", ":"), sort_keys=True).encode()
+
+
+def _period(view, since):
+    return {
+        "since": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(since)),
+        "total_seconds": round(view.total(since=since), 1),
+        "projects": {name: round(seconds, 1) for name, seconds in view.totals_by_project(since=since).items()},
+        "documents": {name: round(seconds, 1) for name, seconds in view.totals_by_entity(since=since).items()},
+    }
+
+
+class StatsRequestHandler(BaseHTTPRequestHandler):
+    server_version = "HackatimeFusionStats/1.0"
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def _respond(self, send_body):
+        if not _allowed_host(self.headers.get("Host", "")):
+            self.send_error(403)
+            return
+        if self.path.split("?", 1)[0] not in STATS_PATHS:
+            self.send_error(404)
+            return
+
+        try:
+            body, etag = self.server.cache.get()
+        except Exception as e:
+            self.send_error(500, explain=str(e))
+            return
+
+        cache_control = f"max-age={int(self.server.cache.ttl)}"
+        if _matches(self.headers.get("If-None-Match", ""), etag):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", cache_control)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", cache_control)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Polling dashboards would flood Fusion's console.
+        pass
+
+
+def _allowed_host(header):
+    """Whether a Host header names this machine, with or without the port."""
+    host, _, port = header.strip().lower().partition(":")
+    return host in ALLOWED_HOSTS and (not port or port.isdigit())
+
+
+def _matches(header, etag):
+    """Whether an If-None-Match header matches the current ETag (weak comparison)."""
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()}
+    return "*" in tags or etag in tags
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # A dashboard hanging up mid response is normal, anything else is logged.
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class StatsServer:
+    """Serves StatsCache over HTTP on 127.0.0.1 from a background thread."""
+
+    def __init__(self, directory: str, port: int = DEFAULT_PORT, ttl: float = DEFAULT_TTL):
+        self.port = port
+        self.cache = StatsCache(directory, ttl)
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://{HOST}:{self.port}/stats"
+
+    def start(self):
+        """Bind and start serving. Raises OSError if the port is taken."""
+        if self._server:
+            return
+        server = _Server((HOST, self.port), StatsRequestHandler)
+        server.cache = self.cache
+        # Port 0 picks a free port.
+        self.port = server.server_address[1]
+        self._server = server
+        self._thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.5},
+                                        name="HackatimeStats", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self._server:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+        self._thread = None
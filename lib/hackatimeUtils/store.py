@@ -0,0 +1,135 @@
+# Local heartbeat storage.
+#
+# Heartbeats that could not be delivered are appended to the offline queue and
+# heartbeats the server accepted are appended to the sent log. Heartbeats the
+# server refuses outright go to the rejected file, so they are kept for a look
+# but never block the offline queue. All files are JSON lines so they can be
+# appended to cheaply and streamed back one record at a time no matter how
+# large they grow.
+
+import json
+import os
+import threading
+from itertools import islice
+
+# Folder the add-in keeps its local state in.
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser("~"), ".wakatime", "fusion")
+
+OFFLINE_QUEUE_FILE = "offline_queue.jsonl"
+# The offline queue is renamed to this while it is being replayed.
+REPLAYING_FILE = "offline_queue.replaying.jsonl"
+SENT_LOG_FILE = "sent_log.jsonl"
+REJECTED_FILE = "rejected.jsonl"
+
+# Sub folder holding the local activity history, see history.py.
+HISTORY_FOLDER = "history"
+
+# Names accepted wherever a part of the store has to be selected.
+SOURCES = ("offline", "sent", "all")
+
+
+def chunked(iterable, size: int):
+    """Yield lists of at most size items without materializing the iterable."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_jsonl(path: str):
+    """Yield one decoded object per line of a JSON lines file.
+
+    Blank lines and lines that can't be decoded (for example a partial line
+    left behind when Fusion was killed mid write) are skipped.
+    """
+    if not os.path.exists(path):
+        return
+
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                print(f"Skipping unreadable line in {path}")
+
+
+class HeartbeatStore:
+    """Append-only offline queue and sent log kept on the local disk."""
+
+    def __init__(self, directory: str = None):
+        self.directory = directory or DEFAULT_DIRECTORY
+        self.offline_path = os.path.join(self.directory, OFFLINE_QUEUE_FILE)
+        self.sent_path = os.path.join(self.directory, SENT_LOG_FILE)
+        self.replaying_path = os.path.join(self.directory, REPLAYING_FILE)
+        self.rejected_path = os.path.join(self.directory, REJECTED_FILE)
+        self.history_directory = os.path.join(self.directory, HISTORY_FOLDER)
+        self._lock = threading.Lock()
+
+    def append_offline(self, heartbeats):
+        """Append heartbeats that still have to be delivered. Returns how many were written."""
+        return self._append(self.offline_path, heartbeats)
+
+    def append_sent(self, heartbeats):
+        """Append heartbeats the server accepted. Returns how many were written."""
+        return self._append(self.sent_path, heartbeats)
+
+    def append_rejected(self, heartbeats):
+        """Append heartbeats the server will never accept. Returns how many were written."""
+        return self._append(self.rejected_path, heartbeats)
+
+    def iter_offline(self):
+        """Stream the offline queue."""
+        return iter_jsonl(self.offline_path)
+
+    def iter_sent(self):
+        """Stream the sent log."""
+        return iter_jsonl(self.sent_path)
+
+    def claim_offline(self):
+        """Take the offline queue over for replaying.
+
+        The queue is renamed so new failures can keep appending to a fresh one
+        while the claimed heartbeats are streamed. A claim left behind by a
+        replay that never finished is returned first. Returns the path to read
+        and hand to release_claim() once done, or None if there is nothing to replay.
+        """
+        with self._lock:
+            if os.path.exists(self.replaying_path):
+                return self.replaying_path
+            if not os.path.exists(self.offline_path):
+                return None
+            os.replace(self.offline_path, self.replaying_path)
+            return self.replaying_path
+
+    def release_claim(self, path: str):
+        """Delete a claimed queue after every heartbeat in it was sent or re-queued."""
+        with self._lock:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def iter_source(self, source: str = "all"):
+        """Stream one part of the store, or the sent log followed by the offline queue for "all"."""
+        if source not in SOURCES:
+            raise ValueError(f"Unknown heartbeat source: {source}")
+
+        if source in ("sent", "all"):
+            yield from self.iter_sent()
+        if source in ("offline", "all"):
+            yield from iter_jsonl(self.replaying_path)
+            yield from self.iter_offline()
+
+    def _append(self, path: str, heartbeats):
+        count = 0
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as file:
+                for heartbeat in heartbeats:
+                    file.write(json.dumps(heartbeat, separators=(",", ":")))
+                    file.write("\n")
+                    count += 1
+        return count
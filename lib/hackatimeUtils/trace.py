@@ -0,0 +1,92 @@
+# Event trace recording.
+#
+# A trace is a JSON lines file. The first line is a header object, every other
+# line is one handled event stored as a compact array:
+#
+#   [offset, event, command_id, command_name, document, duration, workspace]
+#
+# offset is seconds since recording started and duration is how long the add-in
+# spent handling the event, both from time.perf_counter(). workspace is the id
+# of the workspace a workspaceActivated event switched to. Fields that don't
+# apply to an event are null. Version 1 traces have no workspace field.
+
+import json
+import os
+import time
+
+TRACE_VERSION = 2
+READABLE_TRACE_VERSIONS = (1, 2)
+TRACE_FIELD_COUNT = 7
+
+
+def _describe(args):
+    """Pull the command, document and workspace identity out of Fusion event arguments."""
+    command_id = command_name = document = workspace = None
+
+    command_definition = getattr(args, "commandDefinition", None)
+    if command_definition is not None:
+        command_id = command_definition.id
+        command_name = command_definition.name
+
+    event_document = getattr(args, "document", None)
+    if event_document is not None:
+        document = event_document.name
+
+    event_workspace = getattr(args, "workspace", None)
+    if event_workspace is not None:
+        workspace = event_workspace.id
+
+    return command_id, command_name, document, workspace
+
+
+class TraceRecorder:
+    """Appends handled events to a trace file through a buffered writer."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self._started = time.perf_counter()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "w", encoding="utf-8")
+        header = {"trace": TRACE_VERSION, "started": time.time()}
+        self._file.write(json.dumps(header) + "\n")
+
+    def record(self, name: str, args, start: float, duration: float):
+        """Record one handled event. Called on the main thread by the event handlers."""
+        if self._file is None:
+            return
+        try:
+            command_id, command_name, document, workspace = _describe(args)
+        except Exception:
+            command_id = command_name = document = workspace = None
+        line = [round(start - self._started, 6), name, command_id, command_name, document, round(duration, 6),
+                workspace]
+        self._file.write(json.dumps(line, separators=(",", ":")))
+        self._file.write("\n")
+        self.count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_trace(path: str):
+    """Returns the trace header and a generator of (offset, event, command_id,
+    command_name, document, duration, workspace) tuples.
+    """
+    file = open(path, "r", encoding="utf-8")
+    header = json.loads(file.readline())
+    if header.get("trace") not in READABLE_TRACE_VERSIONS:
+        file.close()
+        raise ValueError(f"Unsupported trace version: {header.get('trace')}")
+
+    def events():
+        with file:
+            for line in file:
+                if line.strip():
+                    fields = json.loads(line)
+                    # Older traces lack the trailing fields.
+                    yield tuple(fields) + (None,) * (TRACE_FIELD_COUNT - len(fields))
+
+    return header, events()
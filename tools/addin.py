@@ -0,0 +1,44 @@
+# Loads the add-in outside of Fusion against the adsk stub in tools/stubs.
+#
+# Fusion imports the add-in folder as a package, which is what lets the main
+# script use relative imports. This does the same so the add-in code runs
+# unchanged.
+
+import importlib.machinery
+import importlib.util
+import os
+import sys
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+ADDIN_DIR = os.path.dirname(TOOLS_DIR)
+STUBS_DIR = os.path.join(TOOLS_DIR, "stubs")
+MAIN_SCRIPT = "Wakatime for Fusion.py"
+
+# Package name the add-in folder is imported under.
+PACKAGE = "HackatimeForFusion"
+
+
+def load_addin():
+    """Import the add-in's main script with the adsk stub and return the module."""
+    main_name = f"{PACKAGE}.main"
+    if main_name in sys.modules:
+        return sys.modules[main_name]
+
+    if STUBS_DIR not in sys.path:
+        sys.path.insert(0, STUBS_DIR)
+
+    package = importlib.util.module_from_spec(importlib.machinery.ModuleSpec(PACKAGE, None, is_package=True))
+    package.__path__ = [ADDIN_DIR]
+    sys.modules[PACKAGE] = package
+
+    spec = importlib.util.spec_from_file_location(main_name, os.path.join(ADDIN_DIR, MAIN_SCRIPT))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[main_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def import_addin_module(name: str):
+    """Import a module of the add-in package, for example "commands" or "config"."""
+    load_addin()
+    return importlib.import_module(f"{PACKAGE}.{name}")
@@ -0,0 +1,295 @@
+# Heartbeat journal tool.
+#
+# Streams the heartbeat history the add-in keeps on disk (offline queue plus
+# sent log) to JSON lines or CSV, imports such a file back into the store, or
+# replays it to any WakaTime compatible server through the bulk endpoint.
+# Every step is a generator so memory use stays constant regardless of how much
+# history there is.
+#
+# Run it from the add-in folder:
+#
+#   python -m tools.journal export --format csv -o history.csv
+#   python -m tools.journal import history.csv --into offline
+#   python -m tools.journal replay --host hackatime.example.com --api-key KEY
+
+import argparse
+import csv
+import http.client
+import json
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from lib.hackatimeUtils import api, sent_set, store
+
+# Columns written to CSV. Any other key of a heartbeat goes into the "extra"
+# column as JSON so nothing is lost on the way back in.
+CSV_FIELDS = [
+    "time",
+    "entity",
+    "project",
+    "type",
+    "category",
+    "language",
+    "Editor",
+    "operating_system",
+    "action",
+]
+CSV_EXTRA_FIELD = "extra"
+
+FORMATS = ("jsonl", "csv")
+
+DEFAULT_BATCH_SIZE = api.MAX_BATCH_SIZE
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TIMEOUT = 30
+
+
+def detect_format(path: str):
+    """Guess the format of a journal file from its extension."""
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def heartbeat_to_row(heartbeat: dict):
+    row = {field: heartbeat.get(field, "") for field in CSV_FIELDS}
+    extra = {key: value for key, value in heartbeat.items() if key not in CSV_FIELDS}
+    row[CSV_EXTRA_FIELD] = json.dumps(extra, separators=(",", ":")) if extra else ""
+    return row
+
+
+def row_to_heartbeat(row: dict):
+    heartbeat = {field: row[field] for field in CSV_FIELDS if row.get(field)}
+    if "time" in heartbeat:
+        heartbeat["time"] = float(heartbeat["time"])
+    if row.get(CSV_EXTRA_FIELD):
+        heartbeat.update(json.loads(row[CSV_EXTRA_FIELD]))
+    return heartbeat
+
+
+def write_jsonl(heartbeats, file):
+    count = 0
+    for heartbeat in heartbeats:
+        file.write(json.dumps(heartbeat, separators=(",", ":")))
+        file.write("\n")
+        count += 1
+    return count
+
+
+def write_csv(heartbeats, file):
+    writer = csv.DictWriter(file, fieldnames=CSV_FIELDS + [CSV_EXTRA_FIELD])
+    writer.writeheader()
+    count = 0
+    for heartbeat in heartbeats:
+        writer.writerow(heartbeat_to_row(heartbeat))
+        count += 1
+    return count
+
+
+def read_journal(path: str, fmt: str = None):
+    """Stream heartbeats out of a JSON lines or CSV journal file."""
+    fmt = fmt or detect_format(path)
+    if fmt == "jsonl":
+        yield from store.iter_jsonl(path)
+        return
+
+    with open(path, "r", encoding="utf-8", newline="") as file:
+        for row in csv.DictReader(file):
+            yield row_to_heartbeat(row)
+
+
+def _open_output(path: str):
+    if not path or path == "-":
+        return sys.stdout, False
+    return open(path, "w", encoding="utf-8", newline=""), True
+
+
+class BulkSender:
+    """Posts batches of heartbeats with one reusable connection per worker thread."""
+
+    def __init__(self, host: str, path: str, api_key: str, timeout: float = DEFAULT_TIMEOUT):
+        self.host = host
+        self.path = path
+        self.headers = api.build_headers(api_key)
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def send(self, batch):
+        """Post one batch. Returns (batch, error) where error is None on success."""
+        body = json.dumps(batch, separators=(",", ":"))
+        # Retry once on a fresh connection in case the kept-alive one was dropped.
+        for attempt in range(2):
+            conn = self._connection(fresh=attempt > 0)
+            try:
+                conn.request("POST", self.path, body=body, headers=self.headers)
+                response = conn.getresponse()
+                text = response.read().decode(errors="replace")
+                if response.status in api.ACCEPTED_STATUSES:
+                    return batch, None
+                return batch, f"HTTP {response.status}: {text[:200]}"
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                error = str(e)
+        return batch, error
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+
+    def _connection(self, fresh: bool = False):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or fresh:
+            conn = http.client.HTTPSConnection(self.host, timeout=self.timeout)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+
+def replay(heartbeats, sender: BulkSender, batch_size: int, concurrency: int, failed_file=None):
+    """Send heartbeats in batches keeping at most `concurrency` requests in flight.
+
+    Only `concurrency` batches are ever held in memory, the rest of the input is
+    pulled from the generator as slots free up. Returns (sent, failed) counts.
+    """
+    sent = failed = 0
+    batches = store.chunked(heartbeats, batch_size)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = set()
+        for batch in batches:
+            pending.add(executor.submit(sender.send, batch))
+            if len(pending) < concurrency:
+                continue
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                sent, failed = _collect(future, sent, failed, failed_file)
+
+        for future in pending:
+            sent, failed = _collect(future, sent, failed, failed_file)
+
+    return sent, failed
+
+
+def _collect(future, sent, failed, failed_file):
+    batch, error = future.result()
+    if error is None:
+        return sent + len(batch), failed
+
+    print(f"Failed to send {len(batch)} heartbeats: {error}", file=sys.stderr)
+    if failed_file is not None:
+        write_jsonl(batch, failed_file)
+    return sent, failed + len(batch)
+
+
+def _input_heartbeats(args):
+    if args.input:
+        heartbeats = read_journal(args.input, args.format)
+    else:
+        heartbeats = store.HeartbeatStore(args.store).iter_source(args.source)
+
+    if not args.skip_delivered:
+        return heartbeats
+
+    # Only meaningful when replaying to the server the add-in reports to.
+    delivered = sent_set.SentSet(args.store or store.DEFAULT_DIRECTORY)
+    return (heartbeat for heartbeat in heartbeats if sent_set.payload_id(heartbeat) not in delivered)
+
+
+def command_export(args):
+    heartbeats = store.HeartbeatStore(args.store).iter_source(args.source)
+    fmt = args.format or (detect_format(args.output) if args.output else "jsonl")
+
+    file, should_close = _open_output(args.output)
+    try:
+        count = write_csv(heartbeats, file) if fmt == "csv" else write_jsonl(heartbeats, file)
+    finally:
+        if should_close:
+            file.close()
+
+    print(f"Exported {count} heartbeats.", file=sys.stderr)
+    return 0
+
+
+def command_import(args):
+    heartbeat_store = store.HeartbeatStore(args.store)
+    heartbeats = read_journal(args.input, args.format)
+
+    append = heartbeat_store.append_offline if args.into == "offline" else heartbeat_store.append_sent
+    count = 0
+    # Append in chunks so the store's lock is never held for the whole import.
+    for chunk in store.chunked(heartbeats, 1000):
+        count += append(chunk)
+
+    print(f"Imported {count} heartbeats into the {args.into} store.", file=sys.stderr)
+    return 0
+
+
+def command_replay(args):
+    api_key = args.api_key or api.load_api_key()
+    if not api_key:
+        print("No API key provided. Use --api-key or set it in ~/.wakatime.cfg.", file=sys.stderr)
+        return 2
+
+    sender = BulkSender(args.host, args.path, api_key, timeout=args.timeout)
+    failed_file = open(args.failed, "a", encoding="utf-8") if args.failed else None
+    try:
+        sent, failed = replay(_input_heartbeats(args), sender, args.batch_size, args.concurrency, failed_file)
+    finally:
+        sender.close()
+        if failed_file is not None:
+            failed_file.close()
+
+    print(f"Replayed {sent} heartbeats, {failed} failed.", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m tools.journal", description=__doc__)
+    parser.add_argument("--store", default=None, help=f"Heartbeat store folder (default: {store.DEFAULT_DIRECTORY})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Write the local heartbeat history to JSON lines or CSV.")
+    export_parser.add_argument("--source", choices=store.SOURCES, default="all")
+    export_parser.add_argument("--format", choices=FORMATS, default=None,
+                               help="Output format (default: from the output file extension, otherwise jsonl)")
+    export_parser.add_argument("-o", "--output", default=None, help="Output file (default: stdout)")
+    export_parser.set_defaults(func=command_export)
+
+    import_parser = subparsers.add_parser("import", help="Append a JSON lines or CSV journal to the local store.")
+    import_parser.add_argument("input", help="Journal file to import")
+    import_parser.add_argument("--format", choices=FORMATS, default=None)
+    import_parser.add_argument("--into", choices=("offline", "sent"), default="offline",
+                               help="Import into the offline queue (to be sent) or the sent log")
+    import_parser.set_defaults(func=command_import)
+
+    replay_parser = subparsers.add_parser("replay", help="Send heartbeats to a WakaTime compatible server.")
+    replay_parser.add_argument("--input", default=None, help="Journal file to replay (default: the local store)")
+    replay_parser.add_argument("--format", choices=FORMATS, default=None)
+    replay_parser.add_argument("--source", choices=store.SOURCES, default="all")
+    replay_parser.add_argument("--host", default=api.DEFAULT_API_HOST, help="Server host name, without https://")
+    replay_parser.add_argument("--path", default=api.HEARTBEATS_PATH, help="Bulk heartbeats endpoint path")
+    replay_parser.add_argument("--api-key", default=None, help="API key (default: read from ~/.wakatime.cfg)")
+    replay_parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    replay_parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    replay_parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT)
+    replay_parser.add_argument("--failed", default=None, help="Append heartbeats that could not be sent to this file")
+    replay_parser.add_argument("--skip-delivered", action="store_true",
+                               help="Skip heartbeats the add-in already delivered to its own server")
+    replay_parser.set_defaults(func=command_replay)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if getattr(args, "batch_size", 1) < 1 or getattr(args, "concurrency", 1) < 1:
+        print("--batch-size and --concurrency must be at least 1.", file=sys.stderr)
+        return 2
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
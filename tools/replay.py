@@ -0,0 +1,134 @@
+# Offline replayer for event traces recorded with config.RECORD_TRACE.
+#
+# Loads the add-in against the adsk stub, feeds every recorded event through the
+# same handlers Fusion would call and measures how long the add-in spends on
+# each one. Heartbeats go through the real pipeline up to the network, which is
+# replaced by a fake server with a configurable latency, so the numbers only
+# reflect the add-in's own cost.
+#
+#   python -m tools.replay ~/.wakatime/fusion/traces/trace-20240101-120000.jsonl
+#   python -m tools.replay trace.jsonl --speed 1 --latency 0.2
+
+import argparse
+import contextlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from tools import addin
+
+# Events the replayer knows how to fire, and the object that owns each of them.
+APPLICATION_EVENTS = ("documentOpened", "documentSaved", "documentActivated", "documentDeactivated")
+UI_EVENTS = ("commandCreated", "workspaceActivated")
+
+
+class FakeServer:
+    """Stands in for _post_heartbeat. Sleeps for the given latency and accepts everything."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.count = 0
+
+    def __call__(self, payload):
+        if self.latency:
+            time.sleep(self.latency)
+        self.count += len(payload) if isinstance(payload, list) else 1
+        return True, "Heartbeat sent successfully: 201", 201
+
+
+def build_args(core, event, event_name, command_id, command_name, document, workspace):
+    if event_name == "workspaceActivated":
+        # Fusion switches the active workspace before telling the add-in.
+        ui = core.Application.get().userInterface
+        ui.activeWorkspace = ui.workspaces.itemById(workspace) or ui.activeWorkspace
+        return core.WorkspaceEventArgs(ui.activeWorkspace, event)
+    if event_name in UI_EVENTS:
+        definition = core.CommandDefinition(command_id or command_name or "", command_name or "")
+        return core.ApplicationCommandEventArgs(definition, event)
+    return core.DocumentEventArgs(core.Document(document or "Untitled"), event)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def replay(path, speed=0.0, latency=0.0):
+    """Replay a trace and return {event name: [handler durations]} plus the drain time."""
+    main = addin.load_addin()
+    hutil = addin.import_addin_module("lib.hackatimeUtils")
+    core = sys.modules["adsk.core"]
+    app = core.Application.get()
+
+    header, events = hutil.read_trace(path)
+
+    # Nothing leaves the machine during a replay.
+    config = addin.import_addin_module("config")
+    config.PREWARM_CONNECTION = False
+
+    # Queue, sent set and history go to a scratch directory, never the user's own.
+    manager = main.WakaTimeManager(tempfile.mkdtemp(prefix="hackatime-replay-"))
+    manager.api_key = "replay"
+    server = FakeServer(latency)
+    manager._post_heartbeat = server
+    manager.start_tracking()
+
+    timings = {}
+    skipped = 0
+    started = time.perf_counter()
+    for offset, event_name, command_id, command_name, document, _, workspace in events:
+        if event_name in APPLICATION_EVENTS:
+            event = getattr(app, event_name)
+        elif event_name in UI_EVENTS:
+            event = getattr(app.userInterface, event_name)
+        else:
+            skipped += 1
+            continue
+
+        if speed:
+            delay = started + offset / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        args = build_args(core, event, event_name, command_id, command_name, document, workspace)
+        before = time.perf_counter()
+        event.fire(args)
+        timings.setdefault(event_name, []).append(time.perf_counter() - before)
+        app.processEvents()
+
+    drain_started = time.perf_counter()
+    manager.stop_tracking()
+    app.processEvents()
+    drain = time.perf_counter() - drain_started
+
+    return timings, skipped, drain, server.count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m tools.replay", description=__doc__)
+    parser.add_argument("trace", help="Trace file recorded by the add-in")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="1 replays with the recorded timing, 2 twice as fast, 0 (default) as fast as possible")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the fake server takes per request")
+    args = parser.parse_args(argv)
+
+    # The add-in prints a line for almost every event, keep that out of the report.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        timings, skipped, drain, sent = replay(args.trace, args.speed, args.latency)
+
+    print(f"{'event':<22}{'count':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for event_name, values in sorted(timings.items()):
+        print(f"{event_name:<22}{len(values):>8}"
+              f"{statistics.mean(values) * 1000:>10.3f}"
+              f"{percentile(values, 0.5) * 1000:>10.3f}"
+              f"{percentile(values, 0.95) * 1000:>10.3f}"
+              f"{max(values) * 1000:>10.3f}")
+    print(f"Skipped {skipped} events the replayer can't fire.")
+    print(f"Heartbeats delivered: {sent}, shutdown drain took {drain * 1000:.1f} ms.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
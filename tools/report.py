@@ -0,0 +1,66 @@
+# Local activity report.
+#
+# Totals the activity history the add-in keeps in ~/.wakatime/fusion/history
+# per project, document and day without contacting any server. Install NumPy
+# for the fast path, it works without it too.
+#
+#   python -m tools.report
+#   python -m tools.report --days 30 --documents
+
+import argparse
+import sys
+import time
+
+from lib.hackatimeUtils import history, store
+
+
+def format_duration(seconds: float):
+    minutes = int(seconds // 60)
+    return f"{minutes // 60:>4}h {minutes % 60:02d}m"
+
+
+def print_totals(title, totals, limit=None):
+    print(title)
+    if not totals:
+        print("  no activity")
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+    for name, seconds in ranked[:limit]:
+        print(f"  {format_duration(seconds)}  {name}")
+    print()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m tools.report", description=__doc__)
+    parser.add_argument("--store", default=None, help=f"Heartbeat store folder (default: {store.DEFAULT_DIRECTORY})")
+    parser.add_argument("--days", type=int, default=14, help="Number of days shown in the daily breakdown")
+    parser.add_argument("--documents", action="store_true", help="Also break this week down per document")
+    parser.add_argument("--limit", type=int, default=20, help="Most rows shown per table")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    today, week = history.start_of_today(), history.start_of_week()
+    first_day = today - (args.days - 1) * history.SECONDS_PER_DAY
+
+    with history.ActivityHistory(store.HeartbeatStore(args.store).history_directory).open() as view:
+        print_totals("Today", view.totals_by_project(since=today), args.limit)
+        print_totals("This week", view.totals_by_project(since=week), args.limit)
+        if args.documents:
+            print_totals("This week per document", view.totals_by_entity(since=week), args.limit)
+
+        print(f"Last {args.days} days")
+        daily = view.totals_by_day(since=first_day)
+        for offset in range(args.days):
+            day = time.strftime("%Y-%m-%d", time.localtime(first_day + offset * history.SECONDS_PER_DAY + 43200))
+            print(f"  {day}  {format_duration(daily.get(day, 0.0))}")
+        print()
+
+        print_totals("All time", view.totals_by_project(), args.limit)
+        count = view.count
+
+    engine = "NumPy" if history.np is not None else "pure Python"
+    print(f"{count} heartbeats totalled in {(time.perf_counter() - started) * 1000:.1f} ms ({engine}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
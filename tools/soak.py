@@ -0,0 +1,469 @@
+# Long-session soak test.
+#
+# Designers leave Fusion open for days, so the add-in must not grow while it
+# runs. This loads the add-in against the adsk stub and drives it through weeks
+# of simulated activity: the add-in is run and stopped over and over, its
+# commands are started and stopped in between, and every cycle feeds thousands
+# of document and command events through the real handlers, buffers, sender
+# thread and a local HTTP server standing in for Hackatime.
+#
+# After every cycle it samples resident memory, Python object counts, open file
+# descriptors and sockets, threads, and the add-in's own handler and event
+# registrations. Once the warm-up cycles are over nothing may keep growing:
+# the run fails (exit status 1) when the late samples are above the early ones
+# by more than a small tolerance. It also fails if any event handler raised,
+# handle_error would otherwise swallow the error.
+#
+#   python -m tools.soak
+#   python -m tools.soak --weeks 8 --cycles 40 --stats-server
+#
+# Wall clock time is simulated (time.time and the local time functions follow a
+# virtual clock), so day rollovers of the sent set and history happen as they
+# would over weeks. Monotonic time is real, the sender thread runs at its normal
+# pace.
+
+import argparse
+import contextlib
+import gc
+import http.client
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from tools import addin
+
+# Simulated working day, events only happen inside it.
+WORKDAY_START = 9 * 3600
+WORKDAY_LENGTH = 8 * 3600
+
+# Relative frequency of each simulated event.
+EVENT_WEIGHTS = (
+    ("commandCreated", 70),
+    ("documentActivated", 10),
+    ("documentDeactivated", 6),
+    ("documentSaved", 10),
+    ("documentOpened", 4),
+    ("workspaceActivated", 2),
+)
+
+WORKSPACE_IDS = ("FusionSolidEnvironment", "CAMEnvironment", "FusionDocumentationEnvironment")
+
+COMMAND_NAMES = ("Extrude", "Sketch", "Fillet", "Chamfer", "Move", "Pan", "Orbit", "Line", "Hole", "Shell")
+PROJECTS = ("Gearbox", "Enclosure", "Bracket", "Client Work")
+
+# Tracebacks printed when event handlers raise, the rest are only counted.
+MAX_REPORTED_ERRORS = 3
+
+# Custom events are run every this many events, like Fusion's message loop would.
+PROCESS_EVENTS_EVERY = 50
+
+# Allowed growth of the late samples over the early ones, per metric:
+# (absolute, fraction of the early value). The larger of the two applies.
+TOLERANCES = {
+    "rss_mb": (16.0, 0.10),
+    "objects": (2000, 0.05),
+    "fds": (2, 0.0),
+    "sockets": (1, 0.0),
+    "threads": (1, 0.0),
+    "global_handlers": (0, 0.0),
+    "running_handlers": (0, 0.0),
+    "event_handlers": (0, 0.0),
+    "custom_events": (0, 0.0),
+    "command_definitions": (0, 0.0),
+    "palettes": (0, 0.0),
+}
+
+# Metrics that must stay at or below a fixed limit in every sample after the warm-up.
+LIMITS = {
+    # Global handlers added by the commands.stop()/start() cycles of one run.
+    "handler_growth": 0,
+}
+
+
+class VirtualClock:
+    """Wall clock that starts at a fixed date and only moves when told to.
+
+    Patches time.time, time.localtime, time.gmtime, time.ctime and
+    time.strftime so code asking for "now" gets the simulated time.
+    """
+
+    def __init__(self, start: float):
+        self.now = start
+        self._real = {name: getattr(time, name) for name in ("localtime", "gmtime", "ctime", "strftime")}
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+    @contextlib.contextmanager
+    def installed(self):
+        real = self._real
+
+        def localtime(secs=None):
+            return real["localtime"](self.now if secs is None else secs)
+
+        def gmtime(secs=None):
+            return real["gmtime"](self.now if secs is None else secs)
+
+        def ctime(secs=None):
+            return real["ctime"](self.now if secs is None else secs)
+
+        def strftime(format, t=None):
+            return real["strftime"](format, localtime() if t is None else t)
+
+        with mock.patch.multiple(time, time=lambda: self.now, localtime=localtime, gmtime=gmtime,
+                                 ctime=ctime, strftime=strftime):
+            yield self
+
+
+class FakeHackatime:
+    """Local HTTP server accepting heartbeats like the Hackatime API does."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately, without this Nagle's
+            # algorithm holds the body back on a kept-alive connection.
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or "null")
+                with fake._lock:
+                    fake.count += len(payload) if isinstance(payload, list) else 1
+                body = b'{"responses":[]}'
+                self.send_response(201)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.host = f"127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, name="FakeHackatime", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+        self._thread.join()
+
+
+class Discard:
+    """Write-only sink for the add-in's output. Unlike a devnull file it keeps no
+    buffers, which would show up as growth when several threads print."""
+
+    def write(self, text):
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def rss_mb():
+    """Resident set size in MB, or None where it can't be read."""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss / 1e6
+
+
+def open_descriptors():
+    """(open file descriptors, open sockets), None where they can't be counted."""
+    for folder in ("/proc/self/fd", "/dev/fd"):
+        try:
+            names = os.listdir(folder)
+        except OSError:
+            continue
+        sockets = 0
+        for name in names:
+            try:
+                sockets += os.readlink(os.path.join(folder, name)).startswith("socket:")
+            except OSError:
+                pass
+        return len(names), sockets
+    return None, None
+
+
+class Soak:
+    def __init__(self, args, directory):
+        self.args = args
+        self.directory = directory
+        self.main = addin.load_addin()
+        self.hutil = addin.import_addin_module("lib.hackatimeUtils")
+        self.futil = addin.import_addin_module("lib.fusionAddInUtils")
+        self.event_utils = sys.modules[self.futil.__name__ + ".event_utils"]
+        self.commands = addin.import_addin_module("commands")
+        self.config = addin.import_addin_module("config")
+        self.core = sys.modules["adsk.core"]
+        self.app = self.core.Application.get()
+        self.ui = self.app.userInterface
+
+        self.random = random.Random(args.seed)
+        self.documents = [self.core.Document(f"{self.random.choice(PROJECTS)} part {i}") for i in range(40)]
+        self.event_names = [name for name, _ in EVENT_WEIGHTS]
+        self.event_weights = [weight for _, weight in EVENT_WEIGHTS]
+
+        # Simulated seconds between events, so the events fill `weeks` of working days.
+        total_events = args.cycles * args.events_per_cycle
+        self.step = args.weeks * 5 * WORKDAY_LENGTH / total_events
+        start = time.mktime(time.strptime("2024-01-01", "%Y-%m-%d")) + WORKDAY_START
+        self.clock = VirtualClock(start)
+        self.workday_seconds = 0.0
+
+        self.samples = []
+        self.running_handlers = None
+        self.handler_growth = None
+        self.handler_errors = 0
+        self.first_errors = []  # (handler name, traceback) of the first few errors
+
+    # Driving the add-in
+
+    def run_cycle(self):
+        self.main.run(None)
+        manager = self.main.waka_manager
+
+        # Stopping and starting the commands must release what they registered.
+        handler_counts = []
+        for _ in range(self.args.command_cycles):
+            self.exercise_commands()
+            self.commands.stop()
+            self.commands.start()
+            handler_counts.append(len(self.event_utils._handlers))
+        self.exercise_commands()
+        self.handler_growth = handler_counts[-1] - handler_counts[0] if handler_counts else 0
+
+        for i in range(self.args.events_per_cycle):
+            self.fire_random_event()
+            self.advance_clock()
+            if i % PROCESS_EVENTS_EVERY == 0:
+                self.app.processEvents()
+
+        if manager is not None and manager.stats_server is not None:
+            connection = http.client.HTTPConnection(f"127.0.0.1:{manager.stats_server.port}", timeout=5)
+            with contextlib.suppress(OSError, http.client.HTTPException):
+                connection.request("GET", "/stats")
+                connection.getresponse().read()
+            connection.close()
+
+        # Handlers registered while running, stop() clears the global list so
+        # growth inside a session only shows here.
+        self.running_handlers = len(self.event_utils._handlers) + len(manager._handlers if manager else [])
+
+        self.main.stop(None)
+        self.app.processEvents()
+
+    def exercise_commands(self):
+        for command in self.commands.commands:
+            if command.name == "profileAddin":
+                continue
+            definition = self.ui.commandDefinitions.itemById(command.id)
+            if definition is not None:
+                definition.click().run()
+        palette = self.ui.palettes.itemById(self.config.sample_palette_id)
+        if palette is not None:
+            for action in ("messageFromPalette", "getActivity"):
+                palette.incomingFromHTML.fire(self.core.HTMLEventArgs(action, '{"arg1":"a","arg2":"b"}',
+                                                                      palette.incomingFromHTML))
+
+    def fire_random_event(self):
+        name = self.random.choices(self.event_names, self.event_weights)[0]
+        if name == "commandCreated":
+            command = self.random.choice(COMMAND_NAMES)
+            definition = self.core.CommandDefinition(command, command)
+            self.ui.commandCreated.fire(self.core.ApplicationCommandEventArgs(definition, self.ui.commandCreated))
+            return
+        if name == "workspaceActivated":
+            workspace = self.random.choice(WORKSPACE_IDS)
+            self.ui.activeWorkspace = self.ui.workspaces.itemById(workspace)
+            self.ui.workspaceActivated.fire(self.core.WorkspaceEventArgs(self.ui.activeWorkspace,
+                                                                         self.ui.workspaceActivated))
+            return
+        event = getattr(self.app, name)
+        document = self.random.choice(self.documents)
+        if name == "documentActivated":
+            self.app.activeDocument = document
+        event.fire(self.core.DocumentEventArgs(document, event))
+
+    def advance_clock(self):
+        step = self.random.expovariate(1 / self.step)
+        self.workday_seconds += step
+        # Skip nights and weekends so activity stays inside working hours.
+        while self.workday_seconds >= WORKDAY_LENGTH:
+            self.workday_seconds -= WORKDAY_LENGTH
+            step += 86400 - WORKDAY_LENGTH
+            if time.localtime(self.clock.now + step).tm_wday >= 5:
+                step += 2 * 86400
+        self.clock.advance(step)
+
+    # Measuring
+
+    def sample(self, cycle):
+        # Let request threads of the fake server finish before counting.
+        time.sleep(self.args.settle)
+        gc.collect()
+        fds, sockets = open_descriptors()
+        ui, app = self.ui, self.app
+        events = [app.documentOpened, app.documentSaved, app.documentActivated, app.documentDeactivated,
+                  ui.commandCreated, ui.workspaceActivated]
+        sample = {
+            "cycle": cycle,
+            "day": time.strftime("%Y-%m-%d"),
+            "rss_mb": rss_mb(),
+            "objects": len(gc.get_objects()),
+            "fds": fds,
+            "sockets": sockets,
+            "threads": threading.active_count(),
+            "global_handlers": len(self.event_utils._handlers),
+            "running_handlers": self.running_handlers,
+            "handler_growth": self.handler_growth,
+            "handler_errors": self.handler_errors,
+            "event_handlers": sum(event.handler_count for event in events),
+            "custom_events": len(app._custom_events),
+            "command_definitions": ui.commandDefinitions.count,
+            "palettes": ui.palettes.count,
+        }
+        self.samples.append(sample)
+        return sample
+
+    def growth(self):
+        """[(metric, early, late, allowed)] for metrics that grew past their tolerance."""
+        measured = self.samples[self.args.warmup:]
+        third = max(1, len(measured) // 3)
+        early, late = measured[:third], measured[-third:]
+        failures = []
+        for metric, (absolute, fraction) in TOLERANCES.items():
+            if early[0][metric] is None:
+                continue
+            early_value = statistics.median(sample[metric] for sample in early)
+            late_value = statistics.median(sample[metric] for sample in late)
+            allowed = max(absolute, early_value * fraction)
+            if late_value - early_value > allowed:
+                failures.append((metric, early_value, late_value, allowed))
+        for metric, limit in LIMITS.items():
+            worst = max(sample[metric] for sample in measured)
+            if worst > limit:
+                failures.append((metric, limit, worst, 0))
+        return failures
+
+    def count_error(self, name, show_message_box=False):
+        """Stands in for futil.handle_error, which only logs."""
+        self.handler_errors += 1
+        if len(self.first_errors) < MAX_REPORTED_ERRORS:
+            self.first_errors.append((name, traceback.format_exc()))
+
+    def run(self):
+        fake = FakeHackatime()
+        patches = [
+            # Every module that imported handle_error has its own reference to it.
+            mock.patch.object(sys.modules[self.futil.__name__ + "." + module], "handle_error", self.count_error)
+            for module in ("event_utils", "thread_utils")
+        ] + [
+            # Plain functions rather than mocks, mocks remember every call.
+            mock.patch.object(self.main.WakaTimeManager, "load_api_key", lambda manager: "soak"),
+            mock.patch.object(self.hutil, "load_wakatime_config", lambda *args, **kwargs: None),
+            mock.patch.object(self.hutil, "DEFAULT_API_HOST", fake.host),
+            mock.patch.object(self.hutil.store, "DEFAULT_DIRECTORY", self.directory),
+            # The fake server speaks plain HTTP on localhost.
+            mock.patch.object(http.client, "HTTPSConnection", http.client.HTTPConnection),
+            mock.patch.object(self.config, "STATS_SERVER", self.args.stats_server),
+            mock.patch.object(self.config, "STATS_SERVER_PORT", 0),
+        ]
+        output = sys.stdout
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(fake)
+            for patch in patches:
+                stack.enter_context(patch)
+            stack.enter_context(self.clock.installed())
+            # The add-in prints a line for almost every event, from the sender
+            # thread too, so its output stays redirected for the whole run.
+            stack.enter_context(contextlib.redirect_stdout(Discard()))
+            for cycle in range(1, self.args.cycles + 1):
+                self.run_cycle()
+                report(self.sample(cycle), output, header=cycle == 1)
+        return fake.count
+
+
+COLUMNS = ("cycle", "day", "rss_mb", "objects", "fds", "sockets", "threads", "global_handlers",
+           "running_handlers", "handler_growth", "event_handlers", "custom_events", "command_definitions", "palettes",
+           "handler_errors")
+HEADINGS = ("cycle", "sim day", "rss MB", "objects", "fds", "sockets", "threads", "handlers",
+            "running", "cmd growth", "on events", "custom", "cmd defs", "palettes", "errors")
+
+
+def report(sample, file, header=False):
+    if header:
+        print("".join(f"{heading:>11}" for heading in HEADINGS), file=file)
+    cells = []
+    for column in COLUMNS:
+        value = sample[column]
+        cells.append("-" if value is None else f"{value:.1f}" if isinstance(value, float) else str(value))
+    print("".join(f"{cell:>11}" for cell in cells), file=file, flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m tools.soak", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weeks", type=float, default=2, help="Simulated working weeks the events are spread over")
+    parser.add_argument("--cycles", type=int, default=20, help="Times the add-in is run and stopped")
+    parser.add_argument("--events-per-cycle", type=int, default=3000, help="Events fired between run and stop")
+    parser.add_argument("--command-cycles", type=int, default=3,
+                        help="Extra commands.stop()/start() cycles inside every run")
+    parser.add_argument("--warmup", type=int, default=4, help="Cycles left out of the growth check")
+    parser.add_argument("--settle", type=float, default=0.2, help="Seconds to wait before each sample")
+    parser.add_argument("--stats-server", action="store_true", help="Also run and poll the local stats endpoint")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    if args.cycles - args.warmup < 3:
+        print("Need at least 3 cycles after the warm-up.", file=sys.stderr)
+        return 2
+
+    directory = tempfile.mkdtemp(prefix="hackatime-soak-")
+    started = time.perf_counter()
+    soak = Soak(args, directory)
+    sent = soak.run()
+    print(f"\n{args.cycles * args.events_per_cycle} events over {args.weeks:g} simulated weeks, "
+          f"{sent} heartbeats delivered, {time.perf_counter() - started:.1f} s.")
+
+    status = 0
+    if soak.handler_errors:
+        print(f"ERRORS {soak.handler_errors} event handler calls raised, the first ones:")
+        for name, trace in soak.first_errors:
+            print(f"--- {name}\n{trace}")
+        status = 1
+
+    failures = soak.growth()
+    if not failures:
+        print("No unbounded growth.")
+        return status
+    for metric, early, late, allowed in failures:
+        print(f"GROWTH {metric}: {early:g} -> {late:g} (allowed +{allowed:g})")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
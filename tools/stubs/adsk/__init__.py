@@ -0,0 +1,4 @@
+# Minimal stand-in for Fusion's adsk package so the add-in can be loaded and
+# driven outside of Fusion by the tools in this folder. Only the parts of the
+# API the add-in uses are implemented.
+from . import core, fusion, cam
@@ -0,0 +1 @@
+# Stub of adsk.cam. The add-in imports it but uses nothing from it yet.
@@ -0,0 +1,496 @@
+# Stub of adsk.core.
+#
+# Events keep their handlers in a list and fire() calls them directly. Custom
+# events fired with Application.fireCustomEvent are queued like Fusion does and
+# only run when the tool driving the stub calls Application.processEvents(),
+# which stands in for Fusion's main thread message loop.
+
+import collections
+import threading
+
+from .fusion import Design
+
+# Message boxes and palette messages kept for inspection, older ones are dropped
+# so long runs don't grow.
+MAX_KEPT_MESSAGES = 100
+
+
+class LogLevels:
+    InfoLogLevel = 0
+    WarningLogLevel = 1
+    ErrorLogLevel = 2
+
+
+class LogTypes:
+    ConsoleLogType = 0
+    FileLogType = 1
+
+
+class PaletteDockingStates:
+    PaletteDockStateFloating = 0
+    PaletteDockStateTop = 1
+    PaletteDockStateBottom = 2
+    PaletteDockStateLeft = 3
+    PaletteDockStateRight = 4
+
+
+# Event handlers. The add-in subclasses these and overrides notify().
+
+class EventHandler:
+    def __init__(self):
+        pass
+
+    def notify(self, args):
+        pass
+
+
+class DocumentEventHandler(EventHandler):
+    pass
+
+
+class ApplicationCommandEventHandler(EventHandler):
+    pass
+
+
+class CustomEventHandler(EventHandler):
+    pass
+
+
+class CommandCreatedEventHandler(EventHandler):
+    pass
+
+
+class CommandEventHandler(EventHandler):
+    pass
+
+
+class InputChangedEventHandler(EventHandler):
+    pass
+
+
+class ValidateInputsEventHandler(EventHandler):
+    pass
+
+
+class UserInterfaceGeneralEventHandler(EventHandler):
+    pass
+
+
+class NavigationEventHandler(EventHandler):
+    pass
+
+
+class HTMLEventHandler(EventHandler):
+    pass
+
+
+class WorkspaceEventHandler(EventHandler):
+    pass
+
+
+# Events. add() carries the handler type as a string annotation just like the
+# real API, fusionAddInUtils.add_handler relies on it.
+
+class Event:
+    def __init__(self, name: str, sender=None):
+        self.name = name
+        self.sender = sender  # The object the event belongs to
+        self._handlers = []
+
+    def remove(self, handler) -> bool:
+        if handler in self._handlers:
+            self._handlers.remove(handler)
+            return True
+        return False
+
+    def fire(self, args):
+        for handler in list(self._handlers):
+            handler.notify(args)
+
+    @property
+    def handler_count(self):
+        return len(self._handlers)
+
+
+def _event_type(name: str, handler_type: str):
+    def add(self, handler) -> bool:
+        self._handlers.append(handler)
+        return True
+
+    add.__annotations__['handler'] = handler_type
+    return type(name, (Event,), {'add': add})
+
+
+DocumentEvent = _event_type('DocumentEvent', 'DocumentEventHandler')
+ApplicationCommandEvent = _event_type('ApplicationCommandEvent', 'ApplicationCommandEventHandler')
+CustomEvent = _event_type('CustomEvent', 'CustomEventHandler')
+CommandCreatedEvent = _event_type('CommandCreatedEvent', 'CommandCreatedEventHandler')
+CommandEvent = _event_type('CommandEvent', 'CommandEventHandler')
+InputChangedEvent = _event_type('InputChangedEvent', 'InputChangedEventHandler')
+ValidateInputsEvent = _event_type('ValidateInputsEvent', 'ValidateInputsEventHandler')
+UserInterfaceGeneralEvent = _event_type('UserInterfaceGeneralEvent', 'UserInterfaceGeneralEventHandler')
+NavigationEvent = _event_type('NavigationEvent', 'NavigationEventHandler')
+HTMLEvent = _event_type('HTMLEvent', 'HTMLEventHandler')
+WorkspaceEvent = _event_type('WorkspaceEvent', 'WorkspaceEventHandler')
+
+
+# Event arguments.
+
+class EventArgs:
+    def __init__(self, firingEvent=None):
+        self.firingEvent = firingEvent
+
+
+class DocumentEventArgs(EventArgs):
+    def __init__(self, document, firingEvent=None):
+        super().__init__(firingEvent)
+        self.document = document
+
+
+class ApplicationCommandEventArgs(EventArgs):
+    def __init__(self, commandDefinition, firingEvent=None):
+        super().__init__(firingEvent)
+        self.commandDefinition = commandDefinition
+        self.commandId = commandDefinition.id
+
+
+class CustomEventArgs(EventArgs):
+    def __init__(self, additionalInfo='', firingEvent=None):
+        super().__init__(firingEvent)
+        self.additionalInfo = additionalInfo
+
+
+class CommandCreatedEventArgs(EventArgs):
+    def __init__(self, command, firingEvent=None):
+        super().__init__(firingEvent)
+        self.command = command
+
+
+class CommandEventArgs(EventArgs):
+    def __init__(self, command, firingEvent=None):
+        super().__init__(firingEvent)
+        self.command = command
+
+
+class InputChangedEventArgs(EventArgs):
+    def __init__(self, input, inputs, firingEvent=None):
+        super().__init__(firingEvent)
+        self.input = input
+        self.inputs = inputs
+
+
+class ValidateInputsEventArgs(EventArgs):
+    def __init__(self, inputs, firingEvent=None):
+        super().__init__(firingEvent)
+        self.inputs = inputs
+        self.areInputsValid = True
+
+
+class UserInterfaceGeneralEventArgs(EventArgs):
+    pass
+
+
+class NavigationEventArgs(EventArgs):
+    def __init__(self, navigationURL, firingEvent=None):
+        super().__init__(firingEvent)
+        self.navigationURL = navigationURL
+        self.launchExternally = False
+
+
+class WorkspaceEventArgs(EventArgs):
+    def __init__(self, workspace, firingEvent=None):
+        super().__init__(firingEvent)
+        self.workspace = workspace
+
+
+class HTMLEventArgs(EventArgs):
+    def __init__(self, action, data, firingEvent=None):
+        super().__init__(firingEvent)
+        self.action = action
+        self.data = data
+        self.returnData = ''
+
+
+# Command inputs.
+
+class ValueInput:
+    def __init__(self, expression):
+        self.expression = expression
+
+    @staticmethod
+    def createByString(expression: str):
+        return ValueInput(expression)
+
+
+class CommandInput:
+    def __init__(self, id: str, name: str):
+        self.id = id
+        self.name = name
+
+
+class TextBoxCommandInput(CommandInput):
+    def __init__(self, id, name, text):
+        super().__init__(id, name)
+        self.text = text
+        self.formattedText = text
+
+
+class ValueCommandInput(CommandInput):
+    def __init__(self, id, name, unitType, initialValue):
+        super().__init__(id, name)
+        self.unitType = unitType
+        self.expression = initialValue.expression
+        self.value = 1.0
+
+
+class IntegerSpinnerCommandInput(CommandInput):
+    def __init__(self, id, name, min, max, spinStep, initialValue):
+        super().__init__(id, name)
+        self.minimumValue = min
+        self.maximumValue = max
+        self.value = initialValue
+
+
+class CommandInputs:
+    def __init__(self):
+        self._items = {}
+
+    def _add(self, input):
+        self._items[input.id] = input
+        return input
+
+    def addTextBoxCommandInput(self, id, name, text, numRows, isReadOnly):
+        return self._add(TextBoxCommandInput(id, name, text))
+
+    def addValueInput(self, id, name, unitType, initialValue):
+        return self._add(ValueCommandInput(id, name, unitType, initialValue))
+
+    def addIntegerSpinnerCommandInput(self, id, name, min, max, spinStep, initialValue):
+        return self._add(IntegerSpinnerCommandInput(id, name, min, max, spinStep, initialValue))
+
+    def itemById(self, id):
+        return self._items.get(id)
+
+
+class Command:
+    """A running command, as handed to commandCreated handlers."""
+
+    def __init__(self, parentCommandDefinition):
+        self.parentCommandDefinition = parentCommandDefinition
+        self.commandInputs = CommandInputs()
+        self.execute = CommandEvent('execute')
+        self.executePreview = CommandEvent('executePreview')
+        self.destroy = CommandEvent('destroy')
+        self.inputChanged = InputChangedEvent('inputChanged')
+        self.validateInputs = ValidateInputsEvent('validateInputs')
+
+    def run(self):
+        """Stub only: go through the events Fusion fires when a user clicks OK."""
+        self.validateInputs.fire(ValidateInputsEventArgs(self.commandInputs, self.validateInputs))
+        self.execute.fire(CommandEventArgs(self, self.execute))
+        self.destroy.fire(CommandEventArgs(self, self.destroy))
+
+
+# Application objects.
+
+class Products:
+    def __init__(self, products):
+        self._products = list(products)
+
+    @property
+    def count(self):
+        return len(self._products)
+
+    def item(self, index):
+        return self._products[index]
+
+    def itemByProductType(self, productType):
+        for product in self._products:
+            if product.productType == productType:
+                return product
+        return None
+
+
+class Document:
+    def __init__(self, name: str, dataFile=None):
+        self.name = name
+        self.dataFile = dataFile
+        self.products = Products([Design(name)])
+
+
+class _Collection:
+    """Items by id, like the Fusion collections."""
+
+    def __init__(self):
+        self._items = {}
+
+    def itemById(self, id):
+        return self._items.get(id)
+
+    @property
+    def count(self):
+        return len(self._items)
+
+    def _add(self, item):
+        item._collection = self
+        self._items[item.id] = item
+        return item
+
+
+class _Deletable:
+    _collection = None
+
+    def deleteMe(self) -> bool:
+        if self._collection is not None:
+            self._collection._items.pop(self.id, None)
+            self._collection = None
+        return True
+
+
+class CommandDefinition(_Deletable):
+    def __init__(self, id: str, name: str, tooltip: str = '', resourceFolder: str = ''):
+        self.id = id
+        self.name = name
+        self.tooltip = tooltip
+        self.resourceFolder = resourceFolder
+        self.commandCreated = CommandCreatedEvent('commandCreated')
+
+    def click(self):
+        """Stub only: create the command as Fusion does when its button is clicked."""
+        command = Command(self)
+        self.commandCreated.fire(CommandCreatedEventArgs(command, self.commandCreated))
+        return command
+
+
+class CommandDefinitions(_Collection):
+    def addButtonDefinition(self, id, name, tooltip, resourceFolder=''):
+        return self._add(CommandDefinition(id, name, tooltip, resourceFolder))
+
+
+class CommandControl(_Deletable):
+    def __init__(self, commandDefinition):
+        self.id = commandDefinition.id
+        self.commandDefinition = commandDefinition
+        self.isPromoted = False
+        self.isVisible = True
+
+
+class ToolbarControls(_Collection):
+    def addCommand(self, commandDefinition, positionID='', isBefore=False):
+        return self._add(CommandControl(commandDefinition))
+
+
+class ToolbarPanel:
+    def __init__(self, id):
+        self.id = id
+        self.controls = ToolbarControls()
+
+
+class Workspace:
+    def __init__(self, id, panel_ids, name=None):
+        self.id = id
+        self.name = name or id
+        self.toolbarPanels = _Collection()
+        for panel_id in panel_ids:
+            self.toolbarPanels._add(ToolbarPanel(panel_id))
+
+
+class Palette(_Deletable):
+    def __init__(self, id, name, htmlFileURL):
+        self.id = id
+        self.name = name
+        self.htmlFileURL = htmlFileURL
+        self.isVisible = True
+        self.dockingState = PaletteDockingStates.PaletteDockStateFloating
+        self.closed = UserInterfaceGeneralEvent('closed', self)
+        self.navigatingURL = NavigationEvent('navigatingURL', self)
+        self.incomingFromHTML = HTMLEvent('incomingFromHTML', self)
+        self.sent = collections.deque(maxlen=MAX_KEPT_MESSAGES)
+
+    def sendInfoToHTML(self, action, data):
+        self.sent.append((action, data))
+        return ''
+
+
+class Palettes(_Collection):
+    def add(self, id, name, htmlFileURL, isVisible=True, showCloseButton=True, isResizable=True,
+            width=0, height=0, useNewWebBrowser=True):
+        return self._add(Palette(id, name, htmlFileURL))
+
+
+class UnitsManager:
+    defaultLengthUnits = 'cm'
+
+
+class Product:
+    def __init__(self):
+        self.unitsManager = UnitsManager()
+
+
+class UserInterface:
+    def __init__(self):
+        self.commandCreated = ApplicationCommandEvent('commandCreated')
+        self.commandDefinitions = CommandDefinitions()
+        self.palettes = Palettes()
+        self.workspaces = _Collection()
+        self.workspaces._add(Workspace('FusionSolidEnvironment', ['SolidScriptsAddinsPanel'], 'Design'))
+        self.workspaces._add(Workspace('CAMEnvironment', [], 'Manufacture'))
+        self.workspaces._add(Workspace('FusionDocumentationEnvironment', [], 'Drawing'))
+        self.activeWorkspace = self.workspaces.itemById('FusionSolidEnvironment')
+        self.workspaceActivated = WorkspaceEvent('workspaceActivated')
+        self.messages = collections.deque(maxlen=MAX_KEPT_MESSAGES)
+
+    def messageBox(self, text, *args, **kwargs):
+        self.messages.append(text)
+        return 0
+
+
+class Application:
+    _instance = None
+
+    def __init__(self):
+        self.userInterface = UserInterface()
+        self.activeDocument = Document('Untitled')
+        self.activeProduct = Product()
+        self.documentOpened = DocumentEvent('documentOpened')
+        self.documentSaved = DocumentEvent('documentSaved')
+        self.documentActivated = DocumentEvent('documentActivated')
+        self.documentDeactivated = DocumentEvent('documentDeactivated')
+        self._custom_events = {}
+        self._fired = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get():
+        if Application._instance is None:
+            Application._instance = Application()
+        return Application._instance
+
+    def log(self, message, level=LogLevels.InfoLogLevel, type=LogTypes.ConsoleLogType):
+        pass
+
+    def registerCustomEvent(self, eventId: str):
+        event = self._custom_events.get(eventId)
+        if event is None:
+            event = CustomEvent(eventId)
+            self._custom_events[eventId] = event
+        return event
+
+    def unregisterCustomEvent(self, eventId: str) -> bool:
+        return self._custom_events.pop(eventId, None) is not None
+
+    def fireCustomEvent(self, eventId: str, additionalInfo: str = '') -> bool:
+        # Safe to call from any thread, like the real one.
+        with self._lock:
+            self._fired.append((eventId, additionalInfo))
+        return True
+
+    def processEvents(self):
+        """Stub only: run queued custom events as Fusion's main thread would."""
+        with self._lock:
+            fired, self._fired = self._fired, []
+        for eventId, additionalInfo in fired:
+            event = self._custom_events.get(eventId)
+            if event is not None:
+                event.fire(CustomEventArgs(additionalInfo, event))
+        return len(fired)
@@ -0,0 +1,19 @@
+# Stub of adsk.fusion. Only the design and its active component, which the
+# add-in reads to attribute time to components.
+
+
+class Component:
+    def __init__(self, name: str):
+        self.name = name
+
+
+class Design:
+    productType = 'DesignProductType'
+
+    def __init__(self, root_component_name: str = '(Unsaved)'):
+        self.rootComponent = Component(root_component_name)
+        self.activeComponent = self.rootComponent
+
+    @staticmethod
+    def cast(product):
+        return product if isinstance(product, Design) else None